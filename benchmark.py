@@ -0,0 +1,316 @@
+"""
+Offline detection benchmark for the serverWithForward detector backends
+- Runs each backend (HOG, OpenCV DNN, ...) over a recorded video or a folder of JPEGs (default: ./foto)
+- Reports FPS, p50/p95/p99 per-frame latency, detections per frame and peak memory
+- Sweeps HOG winStride / padding / scale, resize width and DNN batch size
+- Benchmarks the take_photo() encode + GPS EXIF + write pipeline (--photos)
+- Compares JSON and packed binary POST /data payloads: size and decode time (--wire)
+- Writes machine-readable results (JSON) for regression tracking and tuning
+
+No Flask server, database or video window is needed.
+
+Usage:
+- python benchmark.py                                  # foto/ corpus, current config
+- python benchmark.py --video flight.mp4 --max-frames 300
+- python benchmark.py --win-stride 4 8 --scale 1.03 1.05 --width 400 800 --output results.json
+- python benchmark.py --backend hog dnn --batch-size 1 4 8 --output results.json
+- python benchmark.py --photos 100
+- python benchmark.py --wire 1 50 500
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import imutils
+import numpy as np
+import psutil
+
+import serverWithForward as server
+
+# ============================================================
+# FRAME SOURCES
+# ============================================================
+
+def load_frames(video=None, image_dir=server.PHOTO_DIR, max_frames=None):
+    """Decode all benchmark frames up front so decoding is not part of the timings."""
+    frames = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        if not cap.isOpened():
+            raise SystemExit(f"Cannot open video: {video}")
+        while max_frames is None or len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    else:
+        for path in sorted(glob.glob(os.path.join(image_dir, "*.jpg"))):
+            if max_frames is not None and len(frames) >= max_frames:
+                break
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+    if not frames:
+        raise SystemExit("No frames to benchmark")
+    return frames
+
+# ============================================================
+# BENCHMARK
+# ============================================================
+
+def latency_summary(latencies):
+    """mean/p50/p95/p99 in milliseconds for a list of durations in seconds."""
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "mean": round(float(latencies_ms.mean()), 2),
+        "p50": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p95": round(float(np.percentile(latencies_ms, 95)), 2),
+        "p99": round(float(np.percentile(latencies_ms, 99)), 2),
+    }
+
+
+def run_once(backend, frames, width, warmup=3):
+    """Time backend over frames resized to width, fed in batches of backend.batch_size.
+    Per-frame latency is the batch time divided by the batch length, so batched
+    and unbatched backends are compared on the same per-frame footing.
+    """
+    resized = [imutils.resize(f, width=min(width, f.shape[1])) for f in frames]
+    backend.detect_batch(resized[:warmup])
+    batches = [resized[i:i + backend.batch_size] for i in range(0, len(resized), backend.batch_size)]
+
+    process = psutil.Process()
+    peak_rss = process.memory_info().rss
+    tracemalloc.start()
+    latencies = []
+    detections = 0
+    start = time.perf_counter()
+    for batch in batches:
+        t0 = time.perf_counter()
+        detections += sum(len(d) for d in backend.detect_batch(batch))
+        latencies.extend([(time.perf_counter() - t0) / len(batch)] * len(batch))
+        peak_rss = max(peak_rss, process.memory_info().rss)
+    elapsed = time.perf_counter() - start
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "frames": len(resized),
+        "fps": round(len(resized) / elapsed, 2),
+        "latency_ms": latency_summary(latencies),
+        "detections_per_frame": round(detections / len(resized), 3),
+        "peak_rss_mb": round(peak_rss / 2**20, 1),
+        "peak_traced_mb": round(peak_traced / 2**20, 1),
+    }
+
+
+def _configs(backends, win_strides, paddings, scales, widths, batch_sizes):
+    """Yield parameter dicts; HOG sweeps its own params, DNN sweeps batch size."""
+    for name in backends:
+        if name == "hog":
+            for ws, pad, scale, width in itertools.product(win_strides, paddings, scales, widths):
+                yield {"backend": name, "winStride": ws, "padding": pad, "scale": scale,
+                       "width": width, "batch_size": 1}
+        else:
+            for width, batch in itertools.product(widths, batch_sizes):
+                yield {"backend": name, "width": width, "batch_size": batch}
+
+
+def sweep(frames, backends, win_strides, paddings, scales, widths, batch_sizes):
+    """Benchmark every combination of the given parameters."""
+    results = []
+    instances = {}
+    original_params = dict(server.HOG_PARAMS)
+    try:
+        for params in _configs(backends, win_strides, paddings, scales, widths, batch_sizes):
+            name = params["backend"]
+            if name not in instances:
+                instances[name] = server.BACKENDS[name]()
+            backend = instances[name]
+            backend.batch_size = params["batch_size"]
+            if name == "hog":
+                ws, pad = params["winStride"], params["padding"]
+                server.HOG_PARAMS.update(winStride=(ws, ws), padding=(pad, pad), scale=params["scale"])
+            result = dict(params, **run_once(backend, frames, params["width"]))
+            label = " ".join(f"{k}={v}" for k, v in params.items())
+            print("{label:<70} fps={fps:>7} p50={p50:>8}ms p95={p95:>8}ms p99={p99:>8}ms "
+                  "det/frame={det} rss={rss}MB".format(
+                      label=label, fps=result["fps"], det=result["detections_per_frame"],
+                      rss=result["peak_rss_mb"], **result["latency_ms"]))
+            results.append(result)
+    finally:
+        server.HOG_PARAMS.clear()
+        server.HOG_PARAMS.update(original_params)
+    return results
+
+# ============================================================
+# PHOTO PIPELINE
+# ============================================================
+
+SAMPLE_TELEMETRY = {"altitude": "25.4", "latitude": "-6.2088", "longitude": "106.8456"}
+
+
+def _legacy_photo(frame, path, drone_data):
+    """Previous take_photo path: imwrite, then PIL decode + re-encode to add EXIF."""
+    from PIL import Image
+    cv2.imwrite(path, frame)
+    exif = server.gps_exif_bytes(drone_data["latitude"], drone_data["longitude"], drone_data["altitude"])
+    Image.open(path).save(path, "jpeg", exif=exif)
+
+
+def bench_photos(frames, count):
+    """Time take_photo() against the legacy two-encode pipeline on count photos."""
+    results = []
+    original_dir = server.PHOTO_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        server.PHOTO_DIR = tmp
+        try:
+            for name in ("single_encode", "legacy"):
+                latencies, sizes = [], []
+                for i in range(count):
+                    frame = frames[i % len(frames)]
+                    t0 = time.perf_counter()
+                    if name == "single_encode":
+                        path = server.take_photo("bench", f"{name}-{i}", drone_data=SAMPLE_TELEMETRY,
+                                                 frame=frame, detections=server.NO_DETECTIONS)
+                    else:
+                        path = os.path.join(tmp, f"{name}-{i}.jpg")
+                        _legacy_photo(frame, path, SAMPLE_TELEMETRY)
+                    latencies.append(time.perf_counter() - t0)
+                    sizes.append(os.path.getsize(path))
+                result = {
+                    "benchmark": "photo",
+                    "pipeline": name,
+                    "photos": count,
+                    "latency_ms": latency_summary(latencies),
+                    "avg_kb": round(sum(sizes) / len(sizes) / 1024, 1),
+                }
+                print("photo {pipeline:<14} p50={p50:>8}ms p95={p95:>8}ms p99={p99:>8}ms size={kb}KB".format(
+                    pipeline=name, kb=result["avg_kb"], **result["latency_ms"]))
+                results.append(result)
+        finally:
+            server.PHOTO_DIR = original_dir
+    return results
+
+# ============================================================
+# TELEMETRY WIRE FORMAT
+# ============================================================
+
+def _wire_samples(count):
+    """Samples as the Mission Planner scripts send them: str()-ed values plus a timestamp."""
+    rng = np.random.default_rng(0)
+    return [{
+        "altitude": str(round(float(rng.uniform(0, 120)), 2)),
+        "latitude": str(-6.2088 + float(rng.normal(0, 1e-3))),
+        "longitude": str(106.8456 + float(rng.normal(0, 1e-3))),
+        "roll": str(round(float(rng.normal(0, 5)), 2)),
+        "groundspeed": str(round(float(rng.uniform(0, 15)), 2)),
+        "verticalspeed": str(round(float(rng.normal(0, 1)), 2)),
+        "yaw": str(round(float(rng.uniform(0, 360)), 2)),
+        "satcount": str(int(rng.integers(6, 20))),
+        "wp_dist": str(round(float(rng.uniform(0, 500)), 1)),
+        "timestamp": time.time() + i,
+    } for i in range(count)]
+
+
+def _json_decode(body):
+    rows, _, _ = server.parse_telemetry(json.loads(body), False)
+    return rows
+
+
+def bench_wire(batch_sizes, repeat=200):
+    """Payload size and server-side decode time of JSON vs packed telemetry batches."""
+    results = []
+    for batch in batch_sizes:
+        samples = _wire_samples(batch)
+        payloads = {
+            "json": (json.dumps(samples).encode(), _json_decode),
+            "packed": (server.pack_telemetry(samples), lambda body: server.unpack_telemetry(body, False)[0]),
+        }
+        for name, (body, decode) in payloads.items():
+            decode(body)
+            latencies = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                decode(body)
+                latencies.append(time.perf_counter() - t0)
+            result = {
+                "benchmark": "wire",
+                "format": name,
+                "batch": batch,
+                "bytes": len(body),
+                "bytes_per_sample": round(len(body) / batch, 1),
+                "decode_ms": latency_summary(latencies),
+                "decode_us_per_sample": round(float(np.median(latencies)) / batch * 1e6, 2),
+            }
+            print("wire {format:<7} batch={batch:<5} bytes={bytes:<8} ({bytes_per_sample} B/sample) "
+                  "decode p50={p50}ms ({us} us/sample)".format(
+                      us=result["decode_us_per_sample"], **result, **result["decode_ms"]))
+            results.append(result)
+    return results
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def main(argv=None):
+    hog = server.HOG_PARAMS
+    parser = argparse.ArgumentParser(description="Offline benchmark for the human detector")
+    parser.add_argument("--video", help="video file to benchmark (default: JPEGs in --images)")
+    parser.add_argument("--images", default=server.PHOTO_DIR, help="directory of JPEG frames")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--backend", nargs="+", default=[server.DETECTOR_BACKEND], choices=sorted(server.BACKENDS))
+    parser.add_argument("--win-stride", nargs="+", type=int, default=[hog["winStride"][0]])
+    parser.add_argument("--padding", nargs="+", type=int, default=[hog["padding"][0]])
+    parser.add_argument("--scale", nargs="+", type=float, default=[hog["scale"]])
+    parser.add_argument("--width", nargs="+", type=int, default=[800])
+    parser.add_argument("--batch-size", nargs="+", type=int, default=[server.DNN_PARAMS["batch_size"]],
+                        help="batch sizes for batched backends (DNN)")
+    parser.add_argument("--photos", type=int, default=None,
+                        help="benchmark the photo pipeline with this many photos instead of the detector")
+    parser.add_argument("--wire", nargs="+", type=int, default=None, metavar="BATCH",
+                        help="compare JSON and packed /data payloads at these batch sizes instead of the detector")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    if not args.wire and not args.photos and "dnn" in args.backend:
+        for key in ("model", "config"):
+            path = server.DNN_PARAMS[key]
+            if path and not os.path.exists(path):
+                parser.error(f"DNN {key} file not found: {path} (set DNN_PARAMS in serverWithForward.py)")
+
+    frames = []
+    if args.wire:
+        # Synthetic telemetry only; no frames needed
+        results = bench_wire(args.wire)
+    else:
+        frames = load_frames(args.video, args.images, args.max_frames)
+        print(f"Benchmarking {len(frames)} frames from {args.video or args.images}")
+        if args.photos:
+            results = bench_photos(frames, args.photos)
+        else:
+            results = sweep(frames, args.backend, args.win_stride, args.padding, args.scale,
+                            args.width, args.batch_size)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "source": args.video or args.images,
+                "frames": len(frames),
+                "cv2_version": cv2.__version__,
+                "cpu_count": os.cpu_count(),
+                "results": results,
+            }, f, indent=2)
+        print(f"Wrote {len(results)} results to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
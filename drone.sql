@@ -34,7 +34,8 @@ CREATE TABLE IF NOT EXISTS `drone_data` (
   `wp_dist` float DEFAULT NULL,
   `volt` float DEFAULT NULL,
   `battery_remaining` float DEFAULT NULL,
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  KEY `idx_drone_data_timestamp` (`timestamp`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
 -- Dumping data for table drone.drone_data: ~438 rows (approximately)
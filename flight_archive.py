@@ -0,0 +1,187 @@
+"""
+Columnar per-flight archive for drone_data
+- Splits the live drone_data table into flights on time gaps (FLIGHT_GAP_SECONDS)
+- Writes each completed flight as one .npy file per telemetry column plus meta.json
+- Loads flights back as (memory-mapped) NumPy arrays for replay and analytics
+- Optionally prunes archived rows from the live table
+
+Layout:
+    archive/<flight_id>/meta.json
+    archive/<flight_id>/<column>.npy     # timestamp = epoch seconds, missing values = NaN
+
+Usage:
+- python flight_archive.py archive [--prune]
+- python flight_archive.py list
+- from flight_archive import load_flight; cols = load_flight("flight-000001-000438")
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+import serverWithForward as server
+
+# ============================================================
+# CONFIG
+# ============================================================
+ARCHIVE_DIR = "./archive"
+# A gap longer than this between samples ends a flight
+FLIGHT_GAP_SECONDS = 60
+ARCHIVE_COLUMNS = ('id',) + server.TELEMETRY_COLUMNS
+COLUMN_DTYPES = {'id': np.int64, 'human_detected': np.int8}   # everything else float64
+
+# ============================================================
+# READER API
+# ============================================================
+
+def list_flights(archive_dir=ARCHIVE_DIR):
+    """Metadata of every archived flight, oldest first."""
+    if not os.path.isdir(archive_dir):
+        return []
+    flights = []
+    for name in sorted(os.listdir(archive_dir)):
+        meta_path = os.path.join(archive_dir, name, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                flights.append(json.load(f))
+    return flights
+
+
+def load_flight(flight_id, fields=None, mmap=True, archive_dir=ARCHIVE_DIR):
+    """Return {column: ndarray} for one flight. With mmap=True the arrays are
+    memory-mapped read-only, so loading is near-instant regardless of flight length.
+    """
+    flight_dir = os.path.join(archive_dir, flight_id)
+    return {
+        column: np.load(os.path.join(flight_dir, f"{column}.npy"), mmap_mode="r" if mmap else None)
+        for column in (fields or ARCHIVE_COLUMNS)
+    }
+
+# ============================================================
+# ARCHIVER
+# ============================================================
+
+def _last_archived_id(archive_dir):
+    flights = list_flights(archive_dir)
+    return max((f["last_id"] for f in flights), default=None)
+
+
+def _write_flight(columns, archive_dir):
+    """Write one flight's column lists as .npy files, sorted by timestamp; returns its metadata.
+    Rows arrive in id order, which is not time order for client-side or replayed timestamps.
+    """
+    ids, timestamps = columns['id'], columns['timestamp']
+    order = sorted(range(len(ids)), key=timestamps.__getitem__)
+    columns = {c: [values[i] for i in order] for c, values in columns.items()}
+    flight_id = f"flight-{min(ids):06d}-{max(ids):06d}"
+    meta = {
+        "flight_id": flight_id,
+        "first_id": min(ids),
+        "last_id": max(ids),
+        "start": min(timestamps),
+        "end": max(timestamps),
+        "rows": len(ids),
+        "columns": list(ARCHIVE_COLUMNS),
+    }
+
+    final_dir = os.path.join(archive_dir, flight_id)
+    tmp_dir = final_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for column in ARCHIVE_COLUMNS:
+        dtype = COLUMN_DTYPES.get(column, np.float64)
+        values = columns[column]
+        if dtype is np.float64:
+            values = [np.nan if v is None else v for v in values]
+        else:
+            values = [0 if v is None else v for v in values]
+        np.save(os.path.join(tmp_dir, f"{column}.npy"), np.asarray(values, dtype=dtype))
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(tmp_dir, final_dir)
+    server.logger.info("Archived %s (%d rows)", flight_id, meta["rows"])
+    return meta
+
+
+def archive_flights(prune=False, archive_dir=ARCHIVE_DIR, gap=FLIGHT_GAP_SECONDS, now=None):
+    """Archive every completed flight not archived yet, in one streaming pass over drone_data.
+    A row belongs to the current flight when its timestamp is within `gap` seconds of the
+    flight's time span (rows may arrive out of time order); a flight is complete once its
+    newest sample is more than `gap` seconds old.
+    With prune=True the archived rows are deleted from the live table.
+    Returns the metadata of the newly archived flights.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    now = time.time() if now is None else now
+    sql, params = server.telemetry_select(after_id=_last_archived_id(archive_dir), columns=ARCHIVE_COLUMNS)
+
+    archived = []
+    columns = {c: [] for c in ARCHIVE_COLUMNS}
+    start = end = None
+    for row in server.iter_telemetry_rows(sql, params):
+        if row['timestamp'] is None:
+            continue
+        ts = server._epoch(row['timestamp'])
+        if start is not None and (ts > end + gap or ts < start - gap):
+            archived.append(_write_flight(columns, archive_dir))
+            columns = {c: [] for c in ARCHIVE_COLUMNS}
+            start = end = None
+        for c in ARCHIVE_COLUMNS:
+            columns[c].append(ts if c == 'timestamp' else row[c])
+        start = ts if start is None else min(start, ts)
+        end = ts if end is None else max(end, ts)
+
+    # The newest flight may still be in the air
+    if columns['id'] and now - end > gap:
+        archived.append(_write_flight(columns, archive_dir))
+
+    if prune and archived:
+        prune_archived(archived)
+    return archived
+
+
+def prune_archived(flights):
+    """Delete the rows of archived flights from the live drone_data table.
+    Rows without a timestamp are skipped by the archiver, so they are kept here too.
+    """
+    conn = server.connect_database()
+    try:
+        cursor = conn.cursor()
+        for meta in flights:
+            cursor.execute("DELETE FROM drone_data WHERE id BETWEEN %s AND %s AND timestamp IS NOT NULL",
+                           (meta["first_id"], meta["last_id"]))
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    server.logger.info("Pruned %d archived flights from drone_data", len(flights))
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar per-flight telemetry archive")
+    sub = parser.add_subparsers(dest="action", required=True)
+    archive = sub.add_parser("archive", help="archive completed flights")
+    archive.add_argument("--prune", action="store_true", help="delete archived rows from drone_data")
+    archive.add_argument("--gap", type=float, default=FLIGHT_GAP_SECONDS, help="seconds between flights")
+    sub.add_parser("list", help="list archived flights")
+    args = parser.parse_args(argv)
+
+    if args.action == "archive":
+        flights = archive_flights(prune=args.prune, gap=args.gap)
+        print(f"Archived {len(flights)} flights")
+    else:
+        flights = list_flights()
+    for meta in flights:
+        print("{flight_id}  rows={rows:<7} ids={first_id}-{last_id}".format(**meta))
+
+
+if __name__ == "__main__":
+    main()
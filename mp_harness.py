@@ -0,0 +1,181 @@
+"""
+Stand-in harness for postaltWithForward.py
+- Imports the Mission Planner script under CPython with stand-in clr / MissionPlanner /
+  MAVLink / System modules and cs / MAV / Script objects; the main loop does not start
+- Checks that a newer command cancels a running forward(), that the cancelled forward()
+  still sends its zero-velocity stop packet before the next command runs, that a command
+  cancelled while waiting for the previous one never runs, and that every command is acked
+  with the right ok flag
+
+No Mission Planner, drone or server is needed.
+
+Usage:
+- python mp_harness.py
+"""
+import builtins
+import sys
+import threading
+import time
+import types
+
+# type_mask of the zero-velocity stop packet sent by postaltWithForward.stop()
+STOP_TYPE_MASK = 0b0000111111000111
+
+
+class Field:
+    """Stand-in for a .NET field accessor: type(msg).vx.SetValue(msg, value)."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def SetValue(self, obj, value):
+        obj.values[self.name] = value
+
+
+class PositionTarget:
+    """Stand-in for MAVLink.mavlink_set_position_target_local_ned_t."""
+
+    def __init__(self):
+        self.values = {}
+
+
+for _name in ("time_boot_ms", "coordinate_frame", "type_mask", "x", "y", "z",
+              "vx", "vy", "vz", "afx", "afy", "afz", "yaw", "yaw_rate"):
+    setattr(PositionTarget, _name, Field(_name))
+
+
+class StandIns:
+    """Records everything the script sends to the drone, in order."""
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def record(self, event, **values):
+        with self._lock:
+            self.events.append(dict(values, event=event))
+
+    def install(self):
+        modules = {name: types.ModuleType(name) for name in ("clr", "MissionPlanner", "MAVLink", "System", "System.Net")}
+        modules["clr"].AddReference = lambda name: None
+        modules["MAVLink"].MAV_CMD = modules["MAVLink"].MAV_FRAME = types.SimpleNamespace()
+        modules["System"].IO = modules["System"].Text = types.SimpleNamespace()
+        net = modules["System.Net"]
+        net.HttpWebRequest = net.WebResponse = object
+        net.ServicePointManager = types.SimpleNamespace(Expect100Continue=True)
+        sys.modules.update(modules)
+
+        builtins.Script = types.SimpleNamespace(
+            Sleep=lambda ms: time.sleep(ms / 1000.0),
+            ChangeMode=lambda mode: self.record("mode", mode=mode),
+        )
+        builtins.MAV = types.SimpleNamespace(
+            doARM=lambda arm: self.record("arm", arm=arm),
+            sendPacket=lambda msg, sysid, compid: self.record("packet", **msg.values),
+            mavlink_set_position_target_local_ned_t=PositionTarget,
+        )
+        builtins.cs = types.SimpleNamespace(mode="Guided", armed=False, lat=0.0, lng=0.0, alt=0.0)
+
+
+def wait_for_acks(executor, count, timeout=10.0):
+    acks = []
+    deadline = time.monotonic() + timeout
+    while len(acks) < count and time.monotonic() < deadline:
+        acks += executor.take_acks()
+        time.sleep(0.05)
+    return {ack["id"]: ack for ack in acks}
+
+
+def check_superseded_forward(script, standins):
+    """A new command cancels forward(); the stop packet goes out before the new command starts."""
+    executor = script.CommandExecutor()
+    executor.submit(1, "forward,2,0,-2")
+    # forward() arms, waits 2 s, then streams position targets
+    time.sleep(2.5)
+    executor.submit(2, "disarm")
+    acks = wait_for_acks(executor, 2)
+
+    events = standins.events
+    disarm = next(i for i, e in enumerate(events) if e["event"] == "arm" and e["arm"] is False)
+    packets = [e for e in events[:disarm] if e["event"] == "packet"]
+    return [
+        ("forward streamed position targets", len(packets) > 1),
+        ("stop packet sent before the next command", bool(packets) and packets[-1].get("type_mask") == STOP_TYPE_MASK
+         and packets[-1].get("vx") == packets[-1].get("vy") == packets[-1].get("vz") == 0.0),
+        ("no packets after the next command", not any(e["event"] == "packet" for e in events[disarm:])),
+        ("cancelled forward acked not ok", acks.get(1, {}).get("ok") is False),
+        ("next command acked ok", acks.get(2, {}).get("ok") is True),
+    ]
+
+
+def check_cancelled_forward(script, standins):
+    """cancel() (land/rtl/disarm) stops forward() with a stop packet."""
+    executor = script.CommandExecutor()
+    executor.submit(3, "forward,2,0,-2")
+    time.sleep(2.5)
+    before = len(standins.events)
+    executor.cancel("command 4 (land)")
+    acks = wait_for_acks(executor, 1)
+    packets = [e for e in standins.events[before:] if e["event"] == "packet"]
+    return [
+        ("stop packet sent on cancel", bool(packets) and packets[-1].get("type_mask") == STOP_TYPE_MASK),
+        ("executor idle after cancel", not executor.busy()),
+        ("cancelled forward acked not ok", acks.get(3, {}).get("ok") is False),
+    ]
+
+
+def check_cancelled_while_waiting(script, standins):
+    """A command cancelled while it waits for the previous one never runs (no re-arm after disarm)."""
+    executor = script.CommandExecutor()
+    executor.submit(6, "forward,2,0,-2")
+    time.sleep(2.5)
+    # A slow link keeps forward() busy with its stop packet while the disarm arrives
+    send = builtins.MAV.sendPacket
+    builtins.MAV.sendPacket = lambda msg, sysid, compid: (time.sleep(0.2), send(msg, sysid, compid))
+    try:
+        # takeoff waits for forward's stop packet; the disarm cancels it before it starts
+        executor.submit(7, "takeoff,10")
+        executor.cancel("command 8 (disarm)")
+        script.execute_command("disarm")
+        acks = wait_for_acks(executor, 2)
+        time.sleep(0.5)
+    finally:
+        builtins.MAV.sendPacket = send
+
+    events = standins.events
+    disarm = max(i for i, e in enumerate(events) if e["event"] == "arm" and e["arm"] is False)
+    return [
+        ("no mode change or arm after the disarm", not any(e["event"] in ("arm", "mode") for e in events[disarm + 1:])),
+        ("only forward's stop packet after the disarm", all(e.get("type_mask") == STOP_TYPE_MASK
+                                                           for e in events[disarm + 1:] if e["event"] == "packet")),
+        ("cancelled forward acked not ok", acks.get(6, {}).get("ok") is False),
+        ("waiting takeoff acked not ok", acks.get(7, {}).get("ok") is False),
+        ("executor idle after cancel", not executor.busy()),
+    ]
+
+
+def check_failed_command(script, standins):
+    """A command that fails is acked with ok=False."""
+    executor = script.CommandExecutor()
+    executor.submit(5, "forward,not,a,number")
+    acks = wait_for_acks(executor, 1)
+    return [("failed command acked not ok", acks.get(5, {}).get("ok") is False)]
+
+
+def main():
+    standins = StandIns()
+    standins.install()
+    import postaltWithForward as script
+
+    failed = 0
+    for check in (check_superseded_forward, check_cancelled_forward, check_cancelled_while_waiting,
+                  check_failed_command):
+        del standins.events[:]
+        for label, ok in check(script, standins):
+            print(f"{'PASS' if ok else 'FAIL'}  {check.__name__}: {label}")
+            failed += not ok
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,9 @@
+import base64
 import clr
+import collections
 import json
+import struct
+import threading
 clr.AddReference("System")
 clr.AddReference("System.IO")
 clr.AddReference("MissionPlanner")
@@ -8,14 +12,30 @@ import MissionPlanner
 from MAVLink import MAV_CMD, MAV_FRAME
 # from pymavlink import mavutil
 from System import IO, Text
-from System.Net import HttpWebRequest, WebResponse
+from System.Net import HttpWebRequest, WebResponse, ServicePointManager
 import time
 
-def execute_command(command):
+# Semua request memakai ulang satu koneksi keep-alive ke server; matikan handshake
+# Expect: 100-continue yang menambah satu round trip di setiap POST
+ServicePointManager.Expect100Continue = False
+
+def wait(cancel, seconds):
+    """
+    Tidur selama `seconds` detik
+    Returns:
+        bool: True jika command dibatalkan sebelum waktunya habis
+    """
+    if cancel is None:
+        Script.Sleep(int(seconds * 1000))
+        return False
+    return cancel.wait(seconds)
+
+def execute_command(command, cancel=None):
     """
     Fungsi untuk mengeksekusi perintah yang diterima dari API
     Args:
         command: string perintah yang akan dieksekusi
+        cancel: threading.Event; command yang lama (goto, forward, ...) berhenti saat di-set
     Returns:
         bool: True jika berhasil, False jika gagal
     """
@@ -44,11 +64,11 @@ def execute_command(command):
                     z = float(parts[3])           
                     Script.ChangeMode("GUIDED")
                     MAV.doARM(True)
-                    Script.Sleep(2000)
+                    if wait(cancel, 2):
+                        return False
                     # MAV.doCommand(MAV_CMD_NAV_TAKEOFF, 0, 0, 0, 0, 0, 0, 10)  
                     print("execute forward")
-                    forward(x,y,z)   
-                    return True
+                    return forward(x,y,z,cancel)
             except:
                 print("Invalid forward command format")
                 return False
@@ -78,7 +98,8 @@ def execute_command(command):
                     alt = float(parts[1])                
                     Script.ChangeMode("GUIDED")
                     MAV.doARM(True)
-                    Script.Sleep(2000)
+                    if wait(cancel, 2):
+                        return False
                     MAV.doCommand(MAV_CMD.TAKEOFF, 0, 0, 0, 0, 0, 0, alt)       
                     # MAV.doCommand(MAV_CMD_NAV_TAKEOFF, 0, 0, 0, 0, 0, 0, 10)     
                     print("Executing TAKEOFF command")
@@ -109,7 +130,7 @@ def execute_command(command):
                     alt = float(parts[1])
                     lat = float(parts[2])
                     lon = float(parts[3])
-                    return fly(alt, lat, lon)
+                    return fly(alt, lat, lon, cancel)
             except:
                 print("Invalid GOTO command format")
                 return False
@@ -142,7 +163,8 @@ def execute_command(command):
             
             Script.ChangeMode("GUIDED")
             MAV.doARM(True)
-            Script.Sleep(2000)
+            if wait(cancel, 2):
+                return False
             
             return fly2(alt, lat, lon)
                 
@@ -214,6 +236,8 @@ def post_request(url, data):
     request = HttpWebRequest.Create(url)
     request.Method = "POST"
     request.ContentType = "application/json"
+    request.KeepAlive = True
+    request.Proxy = None
     print("ini data kirim",data)
     
     json_data = json.dumps(data)    
@@ -239,6 +263,8 @@ def get_request(url):
     request = HttpWebRequest.Create(url)
     request.Method = "GET"
     request.ContentType = "application/json"    
+    request.KeepAlive = True
+    request.Proxy = None
     
     response = request.GetResponse()
     response_stream = response.GetResponseStream()
@@ -251,13 +277,14 @@ def get_request(url):
     
     return response_text
 
-def fly(altitude, latitude, longitude):
+def fly(altitude, latitude, longitude, cancel=None):
     """
     Fungsi untuk memindahkan drone ke titik koordinat tertentu
     Args:
         altitude: ketinggian dalam meter
         latitude: garis lintang dalam derajat
         longitude: garis bujur dalam derajat
+        cancel: threading.Event; monitoring berhenti (return False) saat di-set
     """
     try:
         # Pastikan drone dalam mode GUIDED
@@ -266,7 +293,8 @@ def fly(altitude, latitude, longitude):
         # Tunggu sampai mode berubah        
         while cs.mode != "Guided":
             print("Menunggu mode GUIDED...")
-            Script.Sleep(1000)
+            if wait(cancel, 1):
+                return False
         
         # Perintah untuk terbang ke titik yang ditentukan
         item = MissionPlanner.Utilities.Locationwp()
@@ -301,7 +329,9 @@ def fly(altitude, latitude, longitude):
                 print("Sampai di titik target!")
                 break
                 
-            Script.Sleep(1000) 
+            if wait(cancel, 1):
+                print("Goto dibatalkan")
+                return False
             
     except Exception as e:
         print(f"Error: {e}")
@@ -309,7 +339,9 @@ def fly(altitude, latitude, longitude):
         
     return True
 
-def forward(x,y,z):
+def forward(x,y,z,cancel=None):
+    msg = None
+    start = time.time()
     try:
         MAV_FRAME_LOCAL_NED = 1
         msg = MAV.mavlink_set_position_target_local_ned_t()
@@ -341,53 +373,276 @@ def forward(x,y,z):
         start = time.time()
         while time.time() - start < duration:
             MAV.sendPacket(msg, 0, 0)
-            time.sleep(0.1)
+            if cancel is None:
+                time.sleep(0.1)
+            elif cancel.wait(0.1):
+                # Command baru yang mengambil alih; jangan kirim ulang target lama
+                print("Forward dibatalkan")
+                return False
+        return True
+
+    except Exception as e:
+        print("Error di fungsi forward(): %s" % str(e))
+        return False
+
+    finally:
+        # === Hentikan drone === selalu, juga saat dibatalkan atau error di tengah jalan
+        if msg is not None:
+            stop(msg)
+            print(f"Drone berhenti setelah {time.time() - start:.1f} detik")
 
-        # === Hentikan drone ===
+def stop(msg):
+    """Kirim velocity nol (hanya velocity aktif) supaya drone berhenti di tempat"""
+    try:
+        type(msg).type_mask.SetValue(msg, int(0b0000111111000111))
         type(msg).vx.SetValue(msg, 0.0)
         type(msg).vy.SetValue(msg, 0.0)
         type(msg).vz.SetValue(msg, 0.0)
         MAV.sendPacket(msg, 0, 0)
-        print(f"Drone berhenti setelah {duration:.1f} detik")
-
     except Exception as e:
-        print("Error di fungsi forward(): %s" % str(e))
+        print("Error mengirim stop: %s" % str(e))
 
-urlpost = "http://127.0.0.1:5000/data"
-urlget = "http://127.0.0.1:5000/command"
-while True:
-    current_altitude = str(cs.alt)
-    current_latitude = str(cs.lat)
-    current_longitude = str(cs.lng)
-    current_roll = str(cs.roll)        
-    current_groundspeed = str(cs.groundspeed) 
-    current_verticalspeed = str(cs.verticalspeed) 
-    current_yaw = str(cs.yaw)        
-    current_satcount = str(cs.satcount)   
-    current_wp_dist = str(cs.wp_dist)  
-    data = {
-    'altitude': current_altitude,
-    'latitude': current_latitude,
-    'longitude': current_longitude,
-    'roll': current_roll,
-    'groundspeed': current_groundspeed,
-    'verticalspeed': current_verticalspeed,
-    'yaw': current_yaw,
-    'satcount': current_satcount,
-    'wp_dist': current_wp_dist
-}
-    time.sleep(1)
-    response_text = post_request(urlpost, data) 
-    # command = get_request(urlget)    
-
-     # Ambil dan eksekusi command
+class CommandExecutor:
+    """
+    Menjalankan command yang lama (goto, forward, takeoff, followtarget) di thread background
+    supaya loop telemetry/command tetap berjalan pada rate-nya
+    - Hanya satu command gerak yang aktif: command gerak baru membatalkan yang lama
+    - cancel() membatalkan command yang aktif (dipakai land, rtl, disarm)
+    - Hasil tiap command dikumpulkan sebagai ack, diambil main loop lewat take_acks()
+    """
+
+    def __init__(self, run=None):
+        self._run_command = run or execute_command
+        self._lock = threading.Lock()
+        self._current = None      # (id command, cancel event) yang sedang berjalan
+        self._thread = None       # thread command terakhir
+        self._reasons = {}        # id command -> alasan pembatalan
+        self._acks = []
+
+    def submit(self, cmd_id, command):
+        """Jalankan command di background; command yang masih berjalan dibatalkan."""
+        cancel = threading.Event()
+        with self._lock:
+            self._cancel_current("digantikan command %s" % cmd_id)
+            self._current = (cmd_id, cancel)
+            previous = self._thread
+            thread = threading.Thread(target=self._run, args=(cmd_id, command, cancel, previous))
+            thread.daemon = True
+            self._thread = thread
+        thread.start()
+        return thread
+
+    def cancel(self, reason):
+        with self._lock:
+            self._cancel_current(reason)
+
+    def busy(self):
+        with self._lock:
+            return self._current is not None
+
+    def take_acks(self):
+        """Ack command yang sudah selesai sejak panggilan sebelumnya."""
+        with self._lock:
+            acks, self._acks = self._acks, []
+            return acks
+
+    def _cancel_current(self, reason):
+        if self._current is not None:
+            cmd_id, cancel = self._current
+            print(f"Membatalkan command {cmd_id}: {reason}")
+            self._reasons[cmd_id] = reason
+            cancel.set()
+            self._current = None
+
+    def _run(self, cmd_id, command, cancel, previous=None):
+        # Tunggu command lama selesai (termasuk paket stop-nya) sebelum command baru mulai
+        if previous is not None:
+            previous.join()
+        if cancel.is_set():
+            # Sudah dibatalkan selama menunggu (mis. disarm): jangan ubah mode/arm lagi
+            ok, error = False, "dibatalkan sebelum mulai"
+        else:
+            try:
+                ok = bool(self._run_command(command, cancel))
+                error = None if ok else "command gagal"
+            except Exception as e:
+                ok, error = False, str(e)
+        with self._lock:
+            if cmd_id in self._reasons:
+                ok, error = False, "dibatalkan: %s" % self._reasons.pop(cmd_id)
+            if self._current is not None and self._current[0] == cmd_id:
+                self._current = None
+            self._acks.append({'id': cmd_id, 'ok': ok, 'error': error})
+
+# /sync: satu request per siklus -- kirim telemetry + ack, terima command baru,
+# follow target dan status deteksi
+urlsync = "http://127.0.0.1:5000/sync"
+# Thread sampler mengambil telemetry tiap SAMPLE_INTERVAL detik ke buffer lokal. Main loop
+# mengirimnya per batch ke /sync dan long-poll di sana sampai FLUSH_INTERVAL detik, jadi
+# command baru sampai dalam hitungan milidetik dengan tetap satu request per flush
+SAMPLE_INTERVAL = 0.5
+FLUSH_INTERVAL = 2
+MAX_BATCH = 50       # sample per request saat menguras buffer
+BUFFER_SIZE = 1000   # bila penuh (server lama down), sample tertua dibuang
+# Dipakai bersama oleh thread sampler dan main loop
+buffer_lock = threading.Lock()
+MAX_BACKOFF = 30     # jeda maksimum antar percobaan saat server tidak bisa dihubungi
+# Command yang dijalankan CommandExecutor di background, dan command yang membatalkannya
+LONG_COMMANDS = ("goto", "forward", "takeoff", "followtarget")
+STOP_COMMANDS = ("land", "rtl", "disarm")
+
+# Telemetry biner (schema 1 di serverWithForward.TELEMETRY_PACKED_SCHEMAS): sekitar
+# 50 byte per sample, bukan ~240 byte JSON. False = kirim sample JSON biasa
+PACKED_TELEMETRY = True
+PACKED_HEADER = "<4sHH"
+PACKED_RECORD = "<dddffffffh"
+
+def _number(v, missing):
     try:
-        command_response = get_request(urlget)
-        if command_response:
-            command_data = json.loads(command_response)
-            if 'command' in command_data:
-                print(command_data)
-                execute_command(command_data['command'])
-    except Exception as e:
-        print(f"Error getting/executing command: {e}")
-    Script.Sleep(2000)
\ No newline at end of file
+        return float(v)
+    except (TypeError, ValueError):
+        return missing
+
+def pack_telemetry(samples):
+    """Encode sample ke format packed /sync (string base64); nilai kosong -> NaN / -1"""
+    nan = float('nan')
+    records = [struct.pack(PACKED_RECORD,
+                           _number(s.get('timestamp'), nan), _number(s.get('latitude'), nan),
+                           _number(s.get('longitude'), nan), _number(s.get('altitude'), nan),
+                           _number(s.get('roll'), nan), _number(s.get('groundspeed'), nan),
+                           _number(s.get('verticalspeed'), nan), _number(s.get('yaw'), nan),
+                           _number(s.get('wp_dist'), nan), int(_number(s.get('satcount'), -1)))
+               for s in samples]
+    header = struct.pack(PACKED_HEADER, b"DTLM", 1, struct.calcsize(PACKED_RECORD))
+    return base64.b64encode(header + b"".join(records)).decode("ascii")
+
+def sample_telemetry(buffer):
+    """Ambil telemetry dari cs ke buffer tiap SAMPLE_INTERVAL detik (rate tetap)"""
+    next_sample = time.time()
+    while True:
+        current_altitude = str(cs.alt)
+        current_latitude = str(cs.lat)
+        current_longitude = str(cs.lng)
+        current_roll = str(cs.roll)        
+        current_groundspeed = str(cs.groundspeed) 
+        current_verticalspeed = str(cs.verticalspeed) 
+        current_yaw = str(cs.yaw)        
+        current_satcount = str(cs.satcount)   
+        current_wp_dist = str(cs.wp_dist)  
+        data = {
+        'altitude': current_altitude,
+        'latitude': current_latitude,
+        'longitude': current_longitude,
+        'roll': current_roll,
+        'groundspeed': current_groundspeed,
+        'verticalspeed': current_verticalspeed,
+        'yaw': current_yaw,
+        'satcount': current_satcount,
+        'wp_dist': current_wp_dist,
+        'timestamp': time.time()
+    }
+        with buffer_lock:
+            if len(buffer) == BUFFER_SIZE:
+                print("Buffer telemetry penuh, sample tertua dibuang")
+            buffer.append(data)
+        next_sample += SAMPLE_INTERVAL
+        Script.Sleep(int(max(0, next_sample - time.time()) * 1000))
+
+def take_batch(buffer):
+    """Ambil (dan hapus) maksimal MAX_BATCH sample tertua dari buffer"""
+    with buffer_lock:
+        return [buffer.popleft() for _ in range(min(MAX_BATCH, len(buffer)))]
+
+def requeue(buffer, samples):
+    """Kembalikan sample yang belum terkirim ke depan buffer; bila penuh, yang tertua dibuang"""
+    with buffer_lock:
+        room = BUFFER_SIZE - len(buffer)
+        if len(samples) > room:
+            print(f"Buffer telemetry penuh, {len(samples) - room} sample tertua dibuang")
+            samples = samples[len(samples) - room:] if room > 0 else []
+        buffer.extendleft(reversed(samples))
+
+def main():
+    telemetry_buffer = collections.deque(maxlen=BUFFER_SIZE)
+    sampler = threading.Thread(target=sample_telemetry, args=(telemetry_buffer,))
+    sampler.daemon = True
+    sampler.start()
+    executor = CommandExecutor()
+    backoff = 0
+    # id command terakhir yang sudah diterima (dikirim sebagai `after`; bukan id ack terakhir,
+    # supaya command yang masih berjalan tidak dikirim ulang), dan ack yang belum terkirim.
+    # None sampai /sync pertama: server menjawab dari versinya sekarang, jadi command
+    # dari sebelum script ini start tidak dieksekusi ulang
+    last_seen = None
+    acks = []
+    while True:
+        # Kirim batch telemetry, ambil dan eksekusi command (hanya command baru)
+        # Batch diambil dari buffer, jadi sampler tetap bisa menambah (dan membuang saat
+        # penuh) selama request berjalan; yang tidak diterima server dikembalikan
+        batch = take_batch(telemetry_buffer)
+        # Masih ada sample tersimpan dari saat server down: kuras tanpa long-poll
+        draining = len(telemetry_buffer) > 0
+        # Sample yang masih dipegang loop ini, dikembalikan bila request gagal
+        unsent = batch
+        # ack dari command background yang sudah selesai
+        acks.extend(executor.take_acks())
+        try:
+            sync = {'acks': acks, 'timeout': 0 if draining else FLUSH_INTERVAL}
+            if batch and PACKED_TELEMETRY:
+                sync['telemetry_packed'] = pack_telemetry(batch)
+            elif batch:
+                sync['telemetry'] = batch
+            if last_seen is not None:
+                sync['after'] = last_seen
+            sync_data = json.loads(post_request(urlsync, sync))
+            # ack sudah diterima server
+            acks = []
+            result = sync_data.get('telemetry', {})
+            # Sample yang tidak diterima (antrian server penuh) tetap di buffer
+            sent = 0 if 'error' in result else len(batch) - result.get('dropped', 0)
+            unsent = []
+            requeue(telemetry_buffer, batch[sent:])
+
+            version = sync_data.get('version', 0)
+            if last_seen is None:
+                last_seen = version
+            elif version < last_seen:
+                # Server restart: id command mulai lagi dari 1
+                last_seen = 0
+            for cmd in sync_data.get('commands', []):
+                print(cmd)
+                last_seen = cmd['id']
+                command = cmd['command'].lower().strip()
+                if command.startswith(LONG_COMMANDS):
+                    # goto/forward baru menggantikan yang lama; ack dikirim saat selesai
+                    executor.submit(cmd['id'], command)
+                    continue
+                if command in STOP_COMMANDS:
+                    executor.cancel("command %s (%s)" % (cmd['id'], command))
+                ack = {'id': cmd['id'], 'ok': True}
+                try:
+                    if not execute_command(command):
+                        ack = {'id': cmd['id'], 'ok': False, 'error': "command gagal"}
+                except Exception as e:
+                    ack = {'id': cmd['id'], 'ok': False, 'error': str(e)}
+                # dikirim bersama telemetry di siklus berikutnya
+                acks.append(ack)
+
+            if sent < len(batch):
+                backoff = min(max(backoff * 2, FLUSH_INTERVAL), MAX_BACKOFF)
+                print(f"Antrian telemetry server penuh (retry dalam {backoff}s)")
+                Script.Sleep(int(backoff * 1000))
+            else:
+                backoff = 0
+        except Exception as e:
+            # Server tidak bisa dihubungi: sample tetap di buffer, coba lagi dengan backoff
+            requeue(telemetry_buffer, unsent)
+            backoff = min(max(backoff * 2, FLUSH_INTERVAL), MAX_BACKOFF)
+            print(f"Error sync/executing command: {e} (retry dalam {backoff}s, {len(telemetry_buffer)} sample di buffer)")
+            Script.Sleep(int(backoff * 1000))
+
+# Loop utama jalan saat script dieksekusi langsung: sebagai __main__, atau oleh Mission
+# Planner yang memasukkan cs/MAV/Script ke scope script. Saat di-import sebagai module
+# (mis. mp_harness.py dengan cs/MAV/Script tiruan) hanya fungsi dan CommandExecutor dimuat
+if "Script" in globals() or __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,5 +1,8 @@
+import base64
 import clr
+import collections
 import json
+import struct
 clr.AddReference("System")
 clr.AddReference("System.IO")
 clr.AddReference("MissionPlanner")
@@ -7,15 +10,23 @@ clr.AddReference("MAVLink")
 import MissionPlanner
 from MAVLink import MAV_CMD
 from System import IO, Text
-from System.Net import HttpWebRequest, WebResponse
+from System.Net import HttpWebRequest, WebResponse, ServicePointManager
 import sys
 import os
+import threading
+import time
+
+# Every request reuses one keep-alive connection to the server; disable the
+# Expect: 100-continue handshake that adds a round trip to every POST
+ServicePointManager.Expect100Continue = False
 
 
 def post_request(url, data):
     request = HttpWebRequest.Create(url)
     request.Method = "POST"
     request.ContentType = "application/json"
+    request.KeepAlive = True
+    request.Proxy = None
     print("ini data kirim",data)
     
     json_data = json.dumps(data)    
@@ -41,6 +52,8 @@ def get_request(url):
     request = HttpWebRequest.Create(url)
     request.Method = "GET"
     request.ContentType = "application/json"    
+    request.KeepAlive = True
+    request.Proxy = None
     
     response = request.GetResponse()
     response_stream = response.GetResponseStream()
@@ -164,20 +177,137 @@ def test_motor(motor_number, throttle_value):
         print(f"Error testing motor: {e}")
         return False
 
-urlpost = "http://127.0.0.1:5000/data"
-urlget = "http://127.0.0.1:5000/command"
+# /sync: one request per cycle -- telemetry and acks up, new commands,
+# follow target and detection state down
+urlsync = "http://127.0.0.1:5000/sync"
+# A sampler thread collects telemetry every SAMPLE_INTERVAL seconds into a local buffer.
+# The main loop sends it in batches to /sync and long-polls there for up to FLUSH_INTERVAL
+# seconds, so new commands arrive within milliseconds while requests stay at one per flush
+SAMPLE_INTERVAL = 0.25
+FLUSH_INTERVAL = 1
+MAX_BATCH = 50       # samples per request while draining the buffer
+BUFFER_SIZE = 1000   # when full (long server outage) the oldest samples are dropped
+MAX_BACKOFF = 30     # longest pause between attempts while the server is unreachable
+telemetry_buffer = collections.deque(maxlen=BUFFER_SIZE)
+# Shared by the sampler thread and the main loop
+buffer_lock = threading.Lock()
+
+# Binary telemetry (schema 1 of serverWithForward.TELEMETRY_PACKED_SCHEMAS): about
+# 50 bytes per sample instead of ~240 as JSON. False sends plain JSON samples
+PACKED_TELEMETRY = True
+PACKED_HEADER = "<4sHH"
+PACKED_RECORD = "<dddffffffh"
+
+def _number(v, missing):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return missing
+
+def pack_telemetry(samples):
+    """Encode samples in the packed /sync format (base64 string); missing values -> NaN / -1."""
+    nan = float('nan')
+    records = [struct.pack(PACKED_RECORD,
+                           _number(s.get('timestamp'), nan), _number(s.get('latitude'), nan),
+                           _number(s.get('longitude'), nan), _number(s.get('altitude'), nan),
+                           _number(s.get('roll'), nan), _number(s.get('groundspeed'), nan),
+                           _number(s.get('verticalspeed'), nan), _number(s.get('yaw'), nan),
+                           _number(s.get('wp_dist'), nan), int(_number(s.get('satcount'), -1)))
+               for s in samples]
+    header = struct.pack(PACKED_HEADER, b"DTLM", 1, struct.calcsize(PACKED_RECORD))
+    return base64.b64encode(header + b"".join(records)).decode("ascii")
+
+def sample_telemetry(buffer):
+    """Append a timestamped sample to buffer every SAMPLE_INTERVAL seconds."""
+    next_sample = time.time()
+    while True:
+        data = get_data()
+        data['timestamp'] = time.time()
+        with buffer_lock:
+            if len(buffer) == BUFFER_SIZE:
+                print("Telemetry buffer full, dropping the oldest sample")
+            buffer.append(data)
+        next_sample += SAMPLE_INTERVAL
+        Script.Sleep(int(max(0, next_sample - time.time()) * 1000))
+
+def take_batch(buffer):
+    """Remove up to MAX_BATCH of the oldest samples from buffer and return them."""
+    with buffer_lock:
+        return [buffer.popleft() for _ in range(min(MAX_BATCH, len(buffer)))]
+
+def requeue(buffer, samples):
+    """Put unsent samples back at the front of buffer; when full, the oldest are dropped."""
+    with buffer_lock:
+        room = BUFFER_SIZE - len(buffer)
+        if len(samples) > room:
+            print(f"Telemetry buffer full, dropping {len(samples) - room} of the oldest samples")
+            samples = samples[len(samples) - room:] if room > 0 else []
+        buffer.extendleft(reversed(samples))
+
+sampler = threading.Thread(target=sample_telemetry, args=(telemetry_buffer,))
+sampler.daemon = True
+sampler.start()
+
+backoff = 0
+# id of the last command received (sent as `after`, not the last acked id, so a
+# command that is still running is not handed out again), and acks not yet
+# delivered to the server.
+# None until the first /sync: the server then answers from its current version, so
+# commands queued before this script started are not executed again
+last_seen = None
+acks = []
 
 while True:
-    data = get_data()
-    response_text = post_request(urlpost, data) 
-    # command = get_request(urlget)    
-     
+    # The batch is taken off the buffer, so the sampler can keep appending (and evicting
+    # when full) while the request runs; whatever the server did not take is put back
+    batch = take_batch(telemetry_buffer)
+    # Samples stored during an outage are drained without waiting on the long-poll
+    draining = len(telemetry_buffer) > 0
+    # Samples still owned by this loop, put back if the request fails
+    unsent = batch
     try:
-        command_response = get_request(urlget)
-        if command_response:
-            command_data = json.loads(command_response)
-            if 'command' in command_data:
-                execute_command(command_data['command'])
+        sync = {'acks': acks, 'timeout': 0 if draining else FLUSH_INTERVAL}
+        if batch and PACKED_TELEMETRY:
+            sync['telemetry_packed'] = pack_telemetry(batch)
+        elif batch:
+            sync['telemetry'] = batch
+        if last_seen is not None:
+            sync['after'] = last_seen
+        sync_data = json.loads(post_request(urlsync, sync))
+        # The server has recorded the acks
+        acks = []
+        result = sync_data.get('telemetry', {})
+        # Samples the server could not queue stay buffered
+        sent = 0 if 'error' in result else len(batch) - result.get('dropped', 0)
+        unsent = []
+        requeue(telemetry_buffer, batch[sent:])
+
+        version = sync_data.get('version', 0)
+        if last_seen is None:
+            last_seen = version
+        elif version < last_seen:
+            # Server restarted and its command ids began again
+            last_seen = 0
+        for cmd in sync_data.get('commands', []):
+            ack = {'id': cmd['id'], 'ok': True}
+            try:
+                if not execute_command(cmd['command']):
+                    ack = {'id': cmd['id'], 'ok': False, 'error': "command failed"}
+            except Exception as e:
+                ack = {'id': cmd['id'], 'ok': False, 'error': str(e)}
+            # Sent along with the next batch
+            acks.append(ack)
+            last_seen = cmd['id']
+
+        if sent < len(batch):
+            backoff = min(max(backoff * 2, FLUSH_INTERVAL), MAX_BACKOFF)
+            print(f"Server telemetry queue full (retry in {backoff}s)")
+            Script.Sleep(int(backoff * 1000))
+        else:
+            backoff = 0
     except Exception as e:
-        print(f"Error getting/executing command: {e}")
-    Script.Sleep(1000)
\ No newline at end of file
+        # Server unreachable: keep the samples and retry with exponential backoff
+        requeue(telemetry_buffer, unsent)
+        backoff = min(max(backoff * 2, FLUSH_INTERVAL), MAX_BACKOFF)
+        print(f"Error syncing/executing command: {e} (retry in {backoff}s, {len(telemetry_buffer)} samples buffered)")
+        Script.Sleep(int(backoff * 1000))
\ No newline at end of file
@@ -8,7 +8,7 @@ Comprehensive, cleaned and robust single-file server for Drone human-detection +
 
 Dependencies:
 - flask, flask_cors
-- opencv-python, imutils, pillow, piexif
+- opencv-python, imutils, piexif
 - mysql-connector-python
 
 Usage:
@@ -17,16 +17,28 @@ Usage:
 - Run: python drone_server_full.py
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from datetime import datetime
 import mysql.connector
+import sqlite3
 import threading
 import cv2
 import imutils
+import numpy as np
 import logging
 import os
 import time
+import atexit
+import base64
+import collections
+import concurrent.futures
+import io
+import itertools
+import multiprocessing
+import queue
+import struct
+import tempfile
 from flask import Flask, send_from_directory
 
 
@@ -34,11 +46,10 @@ from flask import Flask, send_from_directory
 
 # Optional imports used if available
 try:
-    from PIL import Image
     import piexif
-    HAS_PIL = True
+    HAS_PIEXIF = True
 except Exception:
-    HAS_PIL = False
+    HAS_PIEXIF = False
 
 # Try to import MissionPlanner / MAVLink for command execution (optional)
 try:
@@ -57,11 +68,98 @@ except Exception:
 DEBUG = True
 DEBUG_VIDEO = r"C:\sapi\sapi kuliah\iwill\DroneIWILLHumanDetection\VideoDroneIWILL.mp4"
 DB_CONFIG = {"host": "localhost", "user": "root", "password": "", "database": "drone"}
+# "mysql", or "sqlite" for a local stand-in database file (no MySQL server needed)
+DB_BACKEND = "mysql"
+SQLITE_PATH = "drone.sqlite3"
+# Connection pool shared by all routes
+DB_POOL_SIZE = 5
+DB_POOL_TIMEOUT = 5.0       # seconds to wait for a free connection before failing
+DB_POOL_PING_AFTER = 30.0   # health-check connections that sat idle longer than this
+# Write-behind telemetry: POST /data enqueues rows and a background writer commits them in batches
+WRITE_BEHIND = True
+TELEMETRY_QUEUE_SIZE = 10000     # rows buffered in memory at most
+TELEMETRY_PUT_TIMEOUT = 1.0      # seconds a POST waits for queue space before rows are dropped (503/202)
+TELEMETRY_BATCH_SIZE = 500       # max rows per transaction
+TELEMETRY_FLUSH_INTERVAL = 0.5   # max seconds a row waits to be grouped with others
+TELEMETRY_WRITE_RETRIES = 3      # attempts per batch before its rows are counted as failed
+# GET /data: rows fetched per round trip when streaming, and the largest page a client may ask for
+DATA_STREAM_CHUNK = 500
+DATA_MAX_LIMIT = 10000
+# Streamed GET /data responses each read from their own DB connection outside the pool,
+# so slow downloads cannot starve the telemetry writer; more concurrent streams get a 503
+DATA_STREAM_MAX = 2
+# GET /data/aggregate defaults
+AGGREGATE_FIELDS = ('altitude', 'groundspeed', 'satcount')
+AGGREGATE_BUCKET_SECONDS = 10
+AGGREGATE_MAX_POINTS = 5000
+# GET /command long-poll: longest a client may wait for a new command, and SSE keepalive period
+COMMAND_MAX_WAIT = 30.0
+COMMAND_SSE_KEEPALIVE = 15.0
+COMMAND_HISTORY = 200    # commands kept in the queue (with their delivery/ack state)
+# Recent telemetry kept in memory (NumPy ring buffer) to geotag detection photos at the
+# frame's capture time; frames further than TELEMETRY_GEOTAG_MAX_GAP seconds from any
+# sample fall back to the telemetry of the triggering POST
+TELEMETRY_HISTORY_SIZE = 4096
+TELEMETRY_GEOTAG_MAX_GAP = 2.0
 PHOTO_DIR = "./foto"
+PHOTO_JPEG_QUALITY = 95
+# Detection photos are saved by a background writer so /data does not wait on encode + disk I/O
+ASYNC_PHOTOS = True
+PHOTO_WORKERS = 2        # encode/write threads
+PHOTO_MAX_PENDING = 8    # photos queued or in progress; further requests are dropped
+# Near-duplicate suppression: skip a photo whose perceptual hash is within
+# PHOTO_DEDUP_DISTANCE bits of a photo taken in the last PHOTO_DEDUP_WINDOW seconds
+PHOTO_DEDUP = True
+PHOTO_DEDUP_DISTANCE = 6
+PHOTO_DEDUP_WINDOW = 30.0
 os.makedirs(PHOTO_DIR, exist_ok=True)
 human_detected = False
 last_detection_time = None
 
+# Person detector backend: "hog" (default) or "dnn" (OpenCV DNN, see DNN_PARAMS)
+DETECTOR_BACKEND = "hog"
+# HOG detectMultiScale parameters shared by the inline detector and pool workers
+HOG_PARAMS = {"winStride": (4, 4), "padding": (8, 8), "scale": 1.03}
+# OpenCV DNN backend: a local SSD-style person model (Caffe prototxt+caffemodel or ONNX)
+# whose output is the standard DetectionOutput layout [image_id, label, conf, x1, y1, x2, y2].
+# Defaults match MobileNet-SSD (VOC classes, person = 15).
+DNN_PARAMS = {
+    "model": "models/MobileNetSSD_deploy.caffemodel",
+    "config": "models/MobileNetSSD_deploy.prototxt",   # "" for ONNX
+    "input_size": (300, 300),
+    "batch_size": 4,
+    "scale": 0.007843,
+    "mean": (127.5, 127.5, 127.5),
+    "swap_rb": False,
+    "person_class": 15,
+    "confidence": 0.5,
+}
+# Overlapping boxes above this IoU are merged by non-maximum suppression
+NMS_IOU_THRESHOLD = 0.65
+# Number of detection worker processes (0 = detect inline in the detector thread)
+DETECT_WORKERS = 0
+# Seconds between per-worker throughput reports in follow.log
+DETECT_STATS_INTERVAL = 30
+# Motion gate: skip HOG while the scene barely changes and reuse the last detections
+MOTION_GATE = True
+MOTION_GATE_WIDTH = 160         # width of the downscaled grey frame used for differencing
+MOTION_GATE_PIXEL_DELTA = 25    # per-pixel intensity change that counts as "changed"
+MOTION_GATE_THRESHOLD = 0.01    # fraction of changed pixels that forces a HOG scan
+MOTION_GATE_MAX_SKIP = 15       # force a HOG scan after this many reused results
+# Detect-then-track: full HOG every N frames (1 = every frame), optical flow in between.
+# A HOG scan is also forced when the fraction of successfully tracked points drops
+# below TRACK_MIN_CONFIDENCE. Applies to inline detection (DETECT_WORKERS = 0).
+DETECT_EVERY_N = 1
+TRACK_MIN_CONFIDENCE = 0.5
+# Capture thread + ring buffer: the detector always takes the newest frame
+CAPTURE_THREAD = True
+CAPTURE_BUFFER_SIZE = 2
+# Headless: no OpenCV window; annotated frames are only served on GET /stream
+HEADLESS = False
+STREAM_FPS = 10
+STREAM_JPEG_QUALITY = 80
+STREAM_IDLE_TIMEOUT = 5.0   # seconds without a new frame before /stream repeats the last one
+
 # ============================================================
 # LOGGER
 # ============================================================
@@ -74,11 +172,16 @@ logger.addHandler(file_handler)
 # ============================================================
 # VIDEO & DETECTOR SETUP
 # ============================================================
-# We keep a global last_detected_frame shared between threads
-last_detected_frame = None
-
-HOGCV = cv2.HOGDescriptor()
-HOGCV.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+# Detections are (N, 5) float32 arrays of [x, y, w, h, score]
+NO_DETECTIONS = np.empty((0, 5), dtype=np.float32)
+# We keep a global last_detected shared between threads: (frame, detections,
+# time.monotonic() capture time used for geotagging) of the last frame with a
+# detection. It is replaced as one tuple, so a reader never pairs a frame with
+# another frame's boxes. Frames are stored unannotated; boxes are drawn only
+# when a frame is displayed, streamed or saved.
+last_detected = (None, NO_DETECTIONS, None)
+# Most recent detections, reused while the motion gate skips frames
+last_detections = NO_DETECTIONS
 
 # Helper: open video source (debug file or webcam)
 def _open_video_source(path=None):
@@ -107,61 +210,223 @@ def deg_to_dms_rational(deg):
     return ((d, 1), (m, 1), (int(s * 100), 100))
 
 
+def gps_exif_bytes(latitude, longitude, altitude=None):
+    """Build a GPS EXIF segment (piexif.dump output) for the given position."""
+    lat = float(latitude)
+    lon = float(longitude)
+
+    exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
+
+    lat_ref = "N" if lat >= 0 else "S"
+    lon_ref = "E" if lon >= 0 else "W"
+
+    exif_dict["GPS"][piexif.GPSIFD.GPSLatitudeRef] = lat_ref
+    exif_dict["GPS"][piexif.GPSIFD.GPSLatitude] = deg_to_dms_rational(lat)
+    exif_dict["GPS"][piexif.GPSIFD.GPSLongitudeRef] = lon_ref
+    exif_dict["GPS"][piexif.GPSIFD.GPSLongitude] = deg_to_dms_rational(lon)
+
+    if altitude is not None:
+        alt = float(altitude)
+        exif_dict["GPS"][piexif.GPSIFD.GPSAltitudeRef] = 1 if alt < 0 else 0
+        exif_dict["GPS"][piexif.GPSIFD.GPSAltitude] = (int(abs(alt) * 100), 100)
+
+    return piexif.dump(exif_dict)
+
+
 def add_gps_to_image(input_path, output_path, latitude, longitude, altitude=None):
     """Add GPS EXIF to an existing JPEG image. Uses piexif if available.
     latitude/longitude: numeric (float). altitude optional (float).
-    If PIL/piexif not available, function will silently skip EXIF writing but keep the image.
+    The EXIF segment is spliced into the JPEG bytes; the image is not re-encoded.
+    If piexif is not available, function will silently skip EXIF writing but keep the image.
     """
     try:
-        if not HAS_PIL:
-            logger.warning("PIL/piexif not available: skipping EXIF write")
+        if not HAS_PIEXIF:
+            logger.warning("piexif not available: skipping EXIF write")
             return
 
-        lat = float(latitude)
-        lon = float(longitude)
+        with open(input_path, "rb") as f:
+            jpeg = f.read()
+        write_file_atomic(output_path, insert_gps_exif(jpeg, latitude, longitude, altitude))
+        logger.info("Saved GPS EXIF to %s", output_path)
+    except Exception as e:
+        logger.exception("Failed to add GPS EXIF: %s", e)
 
-        img = Image.open(input_path)
 
-        exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
+def insert_gps_exif(jpeg, latitude, longitude, altitude=None):
+    """Return JPEG bytes with a GPS EXIF segment spliced in (no re-encode). Needs piexif."""
+    out = io.BytesIO()
+    piexif.insert(gps_exif_bytes(latitude, longitude, altitude), jpeg, out)
+    return out.getvalue()
 
-        lat_ref = "N" if lat >= 0 else "S"
-        lon_ref = "E" if lon >= 0 else "W"
 
-        exif_dict["GPS"][piexif.GPSIFD.GPSLatitudeRef] = lat_ref
-        exif_dict["GPS"][piexif.GPSIFD.GPSLatitude] = deg_to_dms_rational(lat)
-        exif_dict["GPS"][piexif.GPSIFD.GPSLongitudeRef] = lon_ref
-        exif_dict["GPS"][piexif.GPSIFD.GPSLongitude] = deg_to_dms_rational(lon)
+def write_file_atomic(path, data):
+    """Write bytes to a unique temp file next to path, then rename over it."""
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".",
+                                    suffix=".tmp", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
-        if altitude is not None:
-            alt = float(altitude)
-            exif_dict["GPS"][piexif.GPSIFD.GPSAltitudeRef] = 1 if alt < 0 else 0
-            exif_dict["GPS"][piexif.GPSIFD.GPSAltitude] = (int(abs(alt) * 100), 100)
 
-        exif_bytes = piexif.dump(exif_dict)
-        img.save(output_path, "jpeg", exif=exif_bytes)
-        logger.info("Saved GPS EXIF to %s", output_path)
-    except Exception as e:
-        logger.exception("Failed to add GPS EXIF: %s", e)
+def encode_photo(frame, drone_data=None, quality=PHOTO_JPEG_QUALITY):
+    """Encode frame to JPEG once, in memory, with GPS EXIF spliced in when
+    drone_data has a usable latitude/longitude. Returns the JPEG bytes.
+    """
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    jpeg = buf.tobytes()
+
+    # Try to embed GPS if provided
+    try:
+        if drone_data and HAS_PIEXIF:
+            lat_raw = drone_data.get("latitude")
+            lon_raw = drone_data.get("longitude")
+            alt_raw = drone_data.get("altitude")
+            if lat_raw not in (None, "", "None") and lon_raw not in (None, "", "None"):
+                alt = float(alt_raw) if (alt_raw not in (None, "", "None")) else None
+                jpeg = insert_gps_exif(jpeg, lat_raw, lon_raw, alt)
+        elif drone_data:
+            logger.warning("piexif not available: skipping EXIF write")
+    except Exception:
+        logger.exception("Failed to attach GPS to photo")
+
+    return jpeg
 
 # ============================================================
 # DETECTION & PHOTO FUNCTIONS
 # ============================================================
 
-def detect(frame):
-    """Detect people in frame and update detection state."""
-    global last_detected_frame, human_detected, last_detection_time
+def non_max_suppression(detections, iou_threshold=NMS_IOU_THRESHOLD):
+    """Greedy NMS over an (N, 5) [x, y, w, h, score] array, highest score first."""
+    if len(detections) < 2:
+        return detections
+
+    x1, y1 = detections[:, 0], detections[:, 1]
+    x2, y2 = x1 + detections[:, 2], y1 + detections[:, 3]
+    areas = detections[:, 2] * detections[:, 3]
+    order = np.argsort(detections[:, 4])[::-1]
+
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter)
+        order = rest[iou <= iou_threshold]
+
+    return detections[keep]
+
+
+def hog_detections(hog, frame):
+    """Run a HOG scan and return NMS-filtered (N, 5) [x, y, w, h, score] detections."""
+    boxes, weights = hog.detectMultiScale(frame, **HOG_PARAMS)
+    if len(boxes) == 0:
+        return NO_DETECTIONS
+    detections = np.hstack([
+        np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+        np.asarray(weights, dtype=np.float32).reshape(-1, 1),
+    ])
+    return non_max_suppression(detections)
+
+
+class DetectorBackend:
+    """Person detector interface used by detect(), the worker pool and benchmark.py.
+    detect_batch() takes a list of BGR frames and returns one (N, 5) float32
+    [x, y, w, h, score] array per frame.
+    """
 
-    boxes, _ = HOGCV.detectMultiScale(
-        frame,
-        winStride=(4, 4),
-        padding=(8, 8),
-        scale=1.03
-    )
+    name = None
+    batch_size = 1
+
+    def detect_batch(self, frames):
+        raise NotImplementedError
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+
+class HogBackend(DetectorBackend):
+    """OpenCV HOG + default people SVM, using the live HOG_PARAMS."""
+
+    name = "hog"
+
+    def __init__(self):
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def detect_batch(self, frames):
+        return [hog_detections(self.hog, frame) for frame in frames]
+
+
+class DnnBackend(DetectorBackend):
+    """OpenCV DNN person detector running batched blobFromImages inference on CPU."""
+
+    name = "dnn"
+
+    def __init__(self, params=None):
+        params = dict(DNN_PARAMS, **(params or {}))
+        if not os.path.exists(params["model"]):
+            raise FileNotFoundError(f"DNN model not found: {params['model']}")
+        self.net = cv2.dnn.readNet(params["model"], params["config"] or "")
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.input_size = tuple(params["input_size"])
+        self.batch_size = max(1, int(params["batch_size"]))
+        self.scale = params["scale"]
+        self.mean = tuple(params["mean"])
+        self.swap_rb = params["swap_rb"]
+        self.person_class = params["person_class"]
+        self.confidence = params["confidence"]
+
+    def detect_batch(self, frames):
+        results = []
+        for start in range(0, len(frames), self.batch_size):
+            chunk = frames[start:start + self.batch_size]
+            blob = cv2.dnn.blobFromImages(chunk, self.scale, self.input_size, self.mean,
+                                          swapRB=self.swap_rb, crop=False)
+            self.net.setInput(blob)
+            out = self.net.forward().reshape(-1, 7)
+            out = out[(out[:, 1] == self.person_class) & (out[:, 2] >= self.confidence)]
+            for i, frame in enumerate(chunk):
+                rows = out[out[:, 0] == i]
+                h, w = frame.shape[:2]
+                x1, y1 = rows[:, 3] * w, rows[:, 4] * h
+                x2, y2 = rows[:, 5] * w, rows[:, 6] * h
+                detections = np.stack([x1, y1, x2 - x1, y2 - y1, rows[:, 2]], axis=1).astype(np.float32)
+                results.append(non_max_suppression(detections))
+        return results
+
+
+BACKENDS = {
+    "hog": HogBackend,
+    "dnn": DnnBackend,
+}
+
+
+def create_backend(name=None):
+    """Build the configured detector backend, falling back to HOG if it can't be loaded."""
+    name = name or DETECTOR_BACKEND
+    try:
+        return BACKENDS[name]()
+    except Exception:
+        logger.exception("Detector backend %r unavailable; falling back to HOG", name)
+        return HogBackend()
 
-    detected = False
 
-    for (x, y, w, h) in boxes:
-        detected = True
+def annotate(frame, detections):
+    """Return a copy of frame with detection boxes drawn on it."""
+    frame = frame.copy()
+    for (x, y, w, h) in detections[:, :4].astype(int):
         cv2.rectangle(
             frame,
             (x, y),
@@ -169,92 +434,1072 @@ def detect(frame):
             (0, 255, 0),
             2
         )
+    return frame
+
+
+def apply_detection(frame, detections, captured_at=None):
+    """Update detection state from the detections found on frame.
+    captured_at is the frame's time.monotonic() capture time (default: now).
+    """
+    global last_detected, human_detected, last_detection_time, last_detections
+
+    last_detections = detections
+    detected = len(detections) > 0
 
     if detected:
-        last_detected_frame = frame.copy()
+        last_detected = (frame, detections, time.monotonic() if captured_at is None else captured_at)
         human_detected = True
         last_detection_time = datetime.utcnow()
     else:
         human_detected = False
 
-    return frame, detected
+    return detections
 
-def take_photo(text, filename, drone_data=None):
-    """Capture last detected frame, add overlay text, save image, optionally embed GPS.
-    drone_data: dict containing latitude, longitude, altitude (strings/floats) — will be parsed safely.
+class BoxTracker:
+    """Carry HOG boxes forward between detections with sparse Lucas-Kanade optical flow.
+    Each box is seeded with corner features at detection time; on tracked frames
+    it is shifted by the median displacement of its surviving points.
     """
-    global last_detected_frame
 
-    if last_detected_frame is None:
-        logger.info("No detected frame available; photo not taken")
-        return None
-
-    frame = last_detected_frame.copy()
+    def __init__(self, every_n=DETECT_EVERY_N, min_confidence=TRACK_MIN_CONFIDENCE):
+        self.every_n = every_n
+        self.min_confidence = min_confidence
+        self._gray = None
+        self._tracks = []
+        self._since_detect = 0
+        self.detections = 0
+        self.tracked = 0
+        self.lost = 0
+        self.detect_seconds = 0.0
+        self.track_seconds = 0.0
+
+    def needs_detection(self):
+        return self._gray is None or self._since_detect >= self.every_n - 1
+
+    def reset(self, frame, detections):
+        """Start tracking detections found by a full scan on frame."""
+        self._gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self._tracks = []
+        self._since_detect = 0
+        for det in detections:
+            x, y, w, h = det[:4].astype(int)
+            mask = np.zeros_like(self._gray)
+            mask[y:y + h, x:x + w] = 255
+            points = cv2.goodFeaturesToTrack(self._gray, 30, 0.01, 3, mask=mask)
+            self._tracks.append((det, points))
+
+    def track(self, frame):
+        """Return detections moved onto frame, or None when tracking confidence is too low."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        moved_detections, tracks = [], []
+        total = kept = 0
+        for det, points in self._tracks:
+            if points is None or len(points) == 0:
+                total += 1
+                continue
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self._gray, gray, points, None)
+            good = status.ravel() == 1
+            total += len(points)
+            kept += int(good.sum())
+            if not good.any():
+                continue
+            dx, dy = np.median(moved[good] - points[good], axis=0).ravel()
+            det = det + np.array([dx, dy, 0, 0, 0], dtype=np.float32)
+            moved_detections.append(det)
+            tracks.append((det, moved[good].reshape(-1, 1, 2)))
+
+        if total and kept / total < self.min_confidence:
+            self.lost += 1
+            return None
+
+        self._gray = gray
+        self._tracks = tracks
+        self._since_detect += 1
+        self.tracked += 1
+        return np.array(moved_detections, dtype=np.float32).reshape(-1, 5)
+
+    def stats(self):
+        detect_ms = 1000 * self.detect_seconds / self.detections if self.detections else 0.0
+        track_ms = 1000 * self.track_seconds / self.tracked if self.tracked else 0.0
+        frames = self.detections + self.tracked
+        mixed_ms = 1000 * (self.detect_seconds + self.track_seconds) / frames if frames else 0.0
+        return {
+            "every_n": self.every_n,
+            "detections": self.detections,
+            "tracked": self.tracked,
+            "lost": self.lost,
+            "detect_ms": round(detect_ms, 2),
+            "track_ms": round(track_ms, 2),
+            "fps_gain": round(detect_ms / mixed_ms, 2) if mixed_ms else 1.0,
+        }
+
+
+detector_backend = create_backend()
+box_tracker = BoxTracker() if DETECT_EVERY_N > 1 else None
+
+def detect(frame, captured_at=None):
+    """Detect people in frame with the configured backend and update detection state.
+    Returns an (N, 5) float32 array of [x, y, w, h, score]; frame is not modified.
+    In detect-then-track mode most frames reuse tracked boxes instead of a HOG scan.
+    """
+    if box_tracker is None:
+        return apply_detection(frame, detector_backend.detect(frame), captured_at)
+
+    start = time.perf_counter()
+    if not box_tracker.needs_detection():
+        detections = box_tracker.track(frame)
+        if detections is not None:
+            box_tracker.track_seconds += time.perf_counter() - start
+            return apply_detection(frame, detections, captured_at)
+        start = time.perf_counter()
+
+    detections = detector_backend.detect(frame)
+    box_tracker.reset(frame, detections)
+    box_tracker.detections += 1
+    box_tracker.detect_seconds += time.perf_counter() - start
+    return apply_detection(frame, detections, captured_at)
+
+def save_photo(frame, detections, text, filename, drone_data=None):
+    """Annotate frame, add overlay text, encode once (with GPS EXIF) and write to PHOTO_DIR.
+    frame is not modified. Returns the written path.
+    """
+    frame = annotate(frame, detections)
     pos = (10, frame.shape[0] - 10)
     cv2.putText(frame, str(text), pos, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
 
     filepath = os.path.join(PHOTO_DIR, f"{filename}.jpg")
-    cv2.imwrite(filepath, frame)
+    write_file_atomic(filepath, encode_photo(frame, drone_data))
     logger.info("Saved photo to %s", filepath)
 
-    # Try to embed GPS if provided
+    return filepath
+
+
+def take_photo(text, filename, drone_data=None, frame=None, detections=None):
+    """Capture last detected frame, add overlay text, save image, optionally embed GPS.
+    drone_data: dict containing latitude, longitude, altitude (strings/floats) — will be parsed safely.
+    frame/detections: snapshot to save instead of the last detected frame.
+    The frame is encoded once in memory (EXIF included) and written atomically.
+    """
+    if frame is None:
+        frame, detections, _ = last_detected
+    if frame is None:
+        logger.info("No detected frame available; photo not taken")
+        return None
+
+    return save_photo(frame, detections, text, filename, drone_data)
+
+
+_photo_counter = itertools.count(1)
+
+
+def photo_name():
+    """Unique photo file name: local time to the millisecond plus a per-process counter,
+    so detections in the same second never share (and overwrite) a path.
+    """
+    now = datetime.now()
+    return f"{now:%m-%d-%H-%M-%S}-{now.microsecond // 1000:03d}-{next(_photo_counter)}"
+
+
+def dhash(frame):
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 grey thumbnail."""
+    small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class PhotoDeduplicator:
+    """In-memory index of recent photo hashes used to skip near-duplicate captures."""
+
+    def __init__(self, distance=PHOTO_DEDUP_DISTANCE, window=PHOTO_DEDUP_WINDOW):
+        self.distance = distance
+        self.window = window
+        self._recent = collections.deque()   # (monotonic time, hash), oldest first
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.skipped = 0
+
+    def check(self, frame):
+        """Return the frame's hash, or None if it nearly matches a recent capture.
+        The hash is indexed in the same locked step, so concurrent requests cannot both
+        pass with the same frame; call forget() if the photo is not taken after all.
+        """
+        h = dhash(frame)
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0][0] > self.window:
+                self._recent.popleft()
+            if any(bin(h ^ other).count("1") <= self.distance for _, other in self._recent):
+                self.skipped += 1
+                return None
+            self._recent.append((now, h))
+            self.accepted += 1
+            return h
+
+    def forget(self, h):
+        """Drop the entry check() indexed for a photo that was not saved or queued."""
+        with self._lock:
+            for i, (_, other) in enumerate(self._recent):
+                if other == h:
+                    del self._recent[i]
+                    self.accepted -= 1
+                    return
+
+    def stats(self):
+        with self._lock:
+            total = self.accepted + self.skipped
+            return {
+                "indexed": len(self._recent),
+                "accepted": self.accepted,
+                "skipped": self.skipped,
+                "skip_ratio": round(self.skipped / total, 3) if total else 0.0,
+            }
+
+
+photo_dedup = PhotoDeduplicator() if PHOTO_DEDUP else None
+
+
+class PhotoWriter:
+    """Saves detection photos on a thread pool, off the request path.
+    submit() snapshots the last detected frame and telemetry and returns the
+    path the photo will be written to. At most max_pending photos are queued
+    or in progress; beyond that requests are dropped. Failures are logged and
+    counted, never raised to the caller.
+    """
+
+    def __init__(self, workers=PHOTO_WORKERS, max_pending=PHOTO_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.saved = 0
+        self.failed = 0
+        self.dropped = 0
+        self.save_seconds = 0.0
+        self.max_save_seconds = 0.0
+
+    def submit(self, text, filename, drone_data=None, frame=None, detections=None):
+        """Queue a photo of the last detected frame (or of the given frame/detections snapshot).
+        Returns its future path, or None if not queued.
+        """
+        if frame is None:
+            frame, detections, _ = last_detected
+        if frame is None:
+            logger.info("No detected frame available; photo not taken")
+            return None
+
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                logger.warning("Photo writer busy (%d pending): dropped photo %s", self.pending, filename)
+                return None
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="photo")
+            self.pending += 1
+            self.submitted += 1
+
+        self._executor.submit(self._save, frame, detections, text, filename, dict(drone_data or {}))
+        return os.path.join(PHOTO_DIR, f"{filename}.jpg")
+
+    def _save(self, frame, detections, text, filename, drone_data):
+        start = time.perf_counter()
+        ok = False
+        try:
+            save_photo(frame, detections, text, filename, drone_data)
+            ok = True
+        except Exception:
+            logger.exception("Failed to save photo %s", filename)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.pending -= 1
+            if ok:
+                self.saved += 1
+                self.save_seconds += elapsed
+                self.max_save_seconds = max(self.max_save_seconds, elapsed)
+            else:
+                self.failed += 1
+
+    def stop(self):
+        """Wait for queued photos to be written."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "submitted": self.submitted,
+                "saved": self.saved,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "avg_save_ms": round(1000 * self.save_seconds / self.saved, 3) if self.saved else 0.0,
+                "max_save_ms": round(1000 * self.max_save_seconds, 3),
+            }
+
+
+photo_writer = PhotoWriter()
+atexit.register(photo_writer.stop)
+
+class MotionGate:
+    """Cheap change detector in front of HOG.
+    Frames are downscaled to grey and diffed against the frame HOG last ran on.
+    While the changed-pixel fraction stays below the threshold the previous
+    result is reused (a gate hit); otherwise HOG runs (a gate miss).
+    """
+
+    def __init__(self, width=MOTION_GATE_WIDTH, pixel_delta=MOTION_GATE_PIXEL_DELTA,
+                 threshold=MOTION_GATE_THRESHOLD, max_skip=MOTION_GATE_MAX_SKIP):
+        self.width = width
+        self.pixel_delta = pixel_delta
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.hits = 0
+        self.misses = 0
+        self.last_score = None
+        self._reference = None
+        self._skipped_in_row = 0
+
+    def should_detect(self, frame):
+        """Return True when frame changed enough (or for long enough) to need a HOG scan."""
+        height = max(1, frame.shape[0] * self.width // frame.shape[1])
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        small = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if self._reference is not None and self._reference.shape == small.shape:
+            diff = cv2.absdiff(small, self._reference)
+            _, changed = cv2.threshold(diff, self.pixel_delta, 255, cv2.THRESH_BINARY)
+            self.last_score = cv2.countNonZero(changed) / changed.size
+            if self.last_score < self.threshold and self._skipped_in_row < self.max_skip:
+                self.hits += 1
+                self._skipped_in_row += 1
+                return False
+
+        self._reference = small
+        self._skipped_in_row = 0
+        self.misses += 1
+        return True
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "last_score": round(self.last_score, 4) if self.last_score is not None else None,
+        }
+
+
+motion_gate = MotionGate() if MOTION_GATE else None
+
+# ============================================================
+# DETECTION WORKER POOL
+# ============================================================
+# Each worker process owns its own detector backend, built once by the pool
+# initializer. Workers return detection arrays; the global detection state is
+# applied by the detector thread, in frame order.
+_worker_backend = None
+
+def _init_detect_worker():
+    global _worker_backend
+    _worker_backend = create_backend()
+
+
+def _detect_in_worker(frames):
+    start = time.perf_counter()
+    detections = _worker_backend.detect_batch(frames)
+    return os.getpid(), detections, time.perf_counter() - start
+
+
+class DetectionPool:
+    """Fan frames out to worker processes and return results in frame order.
+    Frames are sent to the workers in batches of batch_size, so a batched
+    backend (DNN) runs one forward pass per batch.
+    """
+
+    def __init__(self, workers, max_in_flight=None, batch_size=1):
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max_in_flight or workers * 2 * self.batch_size
+        self._pool = multiprocessing.Pool(workers, initializer=_init_detect_worker)
+        self._pending = collections.deque()
+        # Frames waiting for a full batch, and the shared slot their AsyncResult goes in
+        self._batch = []
+        self._job = None
+        self._worker_stats = {}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._completed = 0
+
+    def submit(self, frame, reuse=False):
+        """Queue a frame and return every (frame, detections) pair that is ready, oldest first.
+        Blocks on the oldest frame only when max_in_flight frames are outstanding.
+        With reuse=True the frame skips the workers and comes back with detections=None,
+        meaning "keep the previous result", still in frame order.
+        """
+        if reuse:
+            self._pending.append((frame, None, None))
+        else:
+            if self._job is None:
+                self._job = [None]
+            self._pending.append((frame, self._job, len(self._batch)))
+            self._batch.append(frame)
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+        ready = []
+        while self._pending and (len(self._pending) > self.max_in_flight or self._ready(self._pending[0])):
+            ready.append(self._collect())
+        return ready
+
+    def drain(self):
+        """Wait for all outstanding frames and return them in order."""
+        self._flush()
+        ready = []
+        while self._pending:
+            ready.append(self._collect())
+        return ready
+
+    def _flush(self):
+        """Send the partly filled batch to the workers."""
+        if self._batch:
+            self._job[0] = self._pool.apply_async(_detect_in_worker, (self._batch,))
+            self._batch = []
+            self._job = None
+
+    @staticmethod
+    def _ready(entry):
+        _, job, _ = entry
+        return job is None or (job[0] is not None and job[0].ready())
+
+    def _collect(self):
+        frame, job, index = self._pending.popleft()
+        if job is None:
+            return frame, None
+        if job[0] is None:
+            self._flush()
+        pid, detections, elapsed = job[0].get()
+        if index == 0:
+            with self._lock:
+                stats = self._worker_stats.setdefault(pid, {"frames": 0, "busy_seconds": 0.0})
+                stats["frames"] += len(detections)
+                stats["busy_seconds"] += elapsed
+                self._completed += len(detections)
+        return frame, detections[index]
+
+    def stats(self):
+        with self._lock:
+            uptime = time.monotonic() - self._started
+            per_worker = {
+                str(pid): {
+                    "frames": s["frames"],
+                    "busy_seconds": round(s["busy_seconds"], 3),
+                    "fps": round(s["frames"] / s["busy_seconds"], 2) if s["busy_seconds"] else 0.0,
+                }
+                for pid, s in self._worker_stats.items()
+            }
+            return {
+                "workers": self.workers,
+                "batch_size": self.batch_size,
+                "in_flight": len(self._pending),
+                "frames": self._completed,
+                "fps": round(self._completed / uptime, 2) if uptime else 0.0,
+                "per_worker": per_worker,
+            }
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+
+detection_pool = None
+
+# ============================================================
+# CAPTURE RING BUFFER
+# ============================================================
+
+class FrameRingBuffer:
+    """Bounded latest-frame-wins buffer between the capture and detector threads.
+    put() never blocks: when full, the oldest frame is dropped. get_latest()
+    returns the newest frame and drops anything older, so memory stays at
+    most `size` frames however slow detection gets.
+    """
+
+    def __init__(self, size=CAPTURE_BUFFER_SIZE):
+        self.size = size
+        self._frames = collections.deque(maxlen=size)
+        self._cond = threading.Condition()
+        self.closed = False
+        self.captured = 0
+        self.consumed = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._cond:
+            if len(self._frames) == self.size:
+                self.dropped += 1
+            self.captured += 1
+            self._frames.append((time.monotonic(), frame))
+            self._cond.notify()
+
+    def get_latest(self, timeout=None):
+        """Return (capture_time, frame) for the newest frame, or None on timeout/close."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frames or self.closed, timeout):
+                return None
+            if not self._frames:
+                return None
+            item = self._frames.pop()
+            self.dropped += len(self._frames)
+            self._frames.clear()
+            self.consumed += 1
+            return item
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "buffered": len(self._frames),
+                "captured": self.captured,
+                "consumed": self.consumed,
+                "dropped": self.dropped,
+            }
+
+
+def _capture_loop(cap, buffer, fps=None):
+    """Read frames into buffer until the source ends or the buffer is closed.
+    fps paces file sources to real time so a recording behaves like a live feed.
+    """
+    interval = 1.0 / fps if fps else 0
+    next_read = time.monotonic()
     try:
-        if drone_data:
-            lat_raw = drone_data.get("latitude")
-            lon_raw = drone_data.get("longitude")
-            alt_raw = drone_data.get("altitude")
-            if lat_raw not in (None, "", "None") and lon_raw not in (None, "", "None"):
-                lat = float(lat_raw)
-                lon = float(lon_raw)
-                alt = float(alt_raw) if (alt_raw not in (None, "", "None")) else None
-                add_gps_to_image(filepath, filepath, lat, lon, alt)
-    except Exception:
-        logger.exception("Failed to attach GPS to photo")
+        while not buffer.closed and cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            buffer.put(frame)
+            if interval:
+                next_read += interval
+                time.sleep(max(0.0, next_read - time.monotonic()))
+    finally:
+        buffer.close()
 
-    return filepath
+
+frame_buffer = None
+
+# ============================================================
+# MJPEG STREAM BUFFER
+# ============================================================
+
+class StreamBuffer:
+    """Latest detector frame shared with /stream viewers.
+    publish() only stores references; the frame is annotated and JPEG-encoded
+    lazily the first time a viewer asks for it and cached, so each frame is
+    encoded at most once however many viewers are connected (and never with none).
+    """
+
+    def __init__(self, quality=STREAM_JPEG_QUALITY):
+        self.quality = quality
+        self._cond = threading.Condition()
+        self._frame = None
+        self._detections = NO_DETECTIONS
+        self._seq = 0
+        self._jpeg = None
+        self._jpeg_seq = 0
+        self._encoding_seq = 0   # seq being encoded by a viewer, 0 if none
+        self.encoded = 0
+        self.closed = False
+
+    def publish(self, frame, detections=NO_DETECTIONS):
+        with self._cond:
+            self._frame = frame
+            self._detections = detections
+            self._seq += 1
+            self.closed = False
+            self._cond.notify_all()
+
+    def close(self):
+        """Called when the detector stops: viewers waiting for a new frame get None."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def wait_jpeg(self, after_seq=0, timeout=None):
+        """Return (seq, jpeg_bytes) for the first frame newer than after_seq, or None on
+        timeout or once the buffer is closed.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after_seq or self.closed, timeout):
+                return None
+            if self._seq <= after_seq:
+                return None
+            # Another viewer already encoding this frame: wait for its result
+            self._cond.wait_for(lambda: self._encoding_seq != self._seq)
+            if self._jpeg_seq == self._seq:
+                return self._jpeg_seq, self._jpeg
+            seq = self._encoding_seq = self._seq
+            frame = annotate(self._frame, self._detections)
+
+        # Encode outside the lock so publish() and other viewers are not held up
+        ok = False
+        try:
+            ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        finally:
+            with self._cond:
+                if self._encoding_seq == seq:
+                    self._encoding_seq = 0
+                self._cond.notify_all()
+                if ok:
+                    jpeg = buf.tobytes()
+                    self.encoded += 1
+                    if seq > self._jpeg_seq:
+                        self._jpeg, self._jpeg_seq = jpeg, seq
+        return (seq, jpeg) if ok else None
+
+    def stats(self):
+        with self._cond:
+            return {"published": self._seq, "encoded": self.encoded}
+
+
+stream_buffer = StreamBuffer()
 
 # ============================================================
 # BACKGROUND HUMAN DETECTOR THREAD
 # ============================================================
 
+def _show_frame(frame, detections):
+    """Publish a frame with its detections (and display it unless HEADLESS).
+    Returns False when the user pressed 'q'.
+    """
+    stream_buffer.publish(frame, detections)
+
+    if len(detections):
+        logger.info("Human detected")
+
+    if HEADLESS:
+        return True
+
+    cv2.imshow("output", annotate(frame, detections))
+    return not (cv2.waitKey(1) & 0xFF == ord("q"))
+
+
 def human_detector_thread(video_path=None):
+    global detection_pool, frame_buffer
+
     cap = _open_video_source(video_path)
     if not cap or not cap.isOpened():
         logger.error("Detector thread exiting because video source couldn't open")
+        stream_buffer.close()
         return
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    capture_thread = None
+    if CAPTURE_THREAD:
+        is_file = bool(video_path) or DEBUG
+        frame_buffer = FrameRingBuffer(CAPTURE_BUFFER_SIZE)
+        capture_thread = threading.Thread(
+            target=_capture_loop,
+            args=(cap, frame_buffer, cap.get(cv2.CAP_PROP_FPS) if is_file else None),
+            daemon=True,
+        )
+        capture_thread.start()
+
+    if DETECT_WORKERS > 0:
+        batch_size = DNN_PARAMS["batch_size"] if DETECTOR_BACKEND == "dnn" else 1
+        detection_pool = DetectionPool(DETECT_WORKERS, batch_size=batch_size)
+        logger.info("Detection pool started with %d workers, batch size %d", DETECT_WORKERS, batch_size)
+    elif box_tracker is not None:
+        logger.info("Detect-then-track mode: HOG every %d frames", box_tracker.every_n)
+    last_stats_log = time.monotonic()
+    # Capture times of frames still in the (order-preserving) detection pool
+    pool_capture_times = collections.deque()
+
+    running = True
+    while running:
+        if frame_buffer is not None:
+            item = frame_buffer.get_latest(timeout=1.0)
+            if item is None:
+                if frame_buffer.closed:
+                    break
+                continue
+            captured_at, frame = item
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            captured_at = time.monotonic()
 
         frame = imutils.resize(frame, width=min(800, frame.shape[1]))
-        frame, detected = detect(frame)
 
-        cv2.imshow("output", frame)
+        run_hog = motion_gate is None or motion_gate.should_detect(frame)
 
-        if detected:
-            logger.info("Human detected")
-
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
+        if detection_pool is None:
+            if run_hog:
+                running = _show_frame(frame, detect(frame, captured_at))
+            else:
+                running = _show_frame(frame, apply_detection(frame, last_detections, captured_at))
+        else:
+            pool_capture_times.append(captured_at)
+            for frame, detections in detection_pool.submit(frame, reuse=not run_hog):
+                detections = last_detections if detections is None else detections
+                frame_captured_at = pool_capture_times.popleft()
+                running = _show_frame(frame, apply_detection(frame, detections, frame_captured_at)) and running
+
+        if time.monotonic() - last_stats_log >= DETECT_STATS_INTERVAL:
+            if detection_pool is not None:
+                logger.info("Detection pool stats: %s", detection_pool.stats())
+            if motion_gate is not None:
+                logger.info("Motion gate stats: %s", motion_gate.stats())
+            if frame_buffer is not None:
+                logger.info("Capture buffer stats: %s", frame_buffer.stats())
+            if box_tracker is not None:
+                logger.info("Tracker stats: %s", box_tracker.stats())
+            last_stats_log = time.monotonic()
+
+    if detection_pool is not None:
+        for frame, detections in detection_pool.drain():
+            apply_detection(frame, last_detections if detections is None else detections,
+                            pool_capture_times.popleft())
+        logger.info("Detection pool stats: %s", detection_pool.stats())
+        detection_pool.close()
+        detection_pool = None
+
+    if capture_thread is not None:
+        frame_buffer.close()
+        capture_thread.join()
+        logger.info("Capture buffer stats: %s", frame_buffer.stats())
 
     cap.release()
-    cv2.destroyAllWindows()
+    stream_buffer.close()
+    if not HEADLESS:
+        cv2.destroyAllWindows()
 
 # ============================================================
 # DATABASE HELPERS
 # ============================================================
 
+class SQLiteConnection:
+    """Minimal mysql.connector-style wrapper over sqlite3, used as a local stand-in.
+    Supports cursor(dictionary=True), %s placeholders, commit/rollback and ping.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, dictionary=False):
+        return _SQLiteCursor(self._conn.cursor(), dictionary)
+
+    def ping(self, reconnect=False):
+        self._conn.execute("SELECT 1")
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+class _SQLiteCursor:
+    def __init__(self, cursor, dictionary):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def execute(self, query, params=()):
+        self._cursor.execute(query.replace("%s", "?"), params)
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(query.replace("%s", "?"), seq_params)
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {col[0]: value for col, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+
+
+class PooledConnection:
+    """Connection checked out of a ConnectionPool. close() returns it to the pool."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            conn.rollback()
+        except Exception:
+            self._pool.release(conn, broken=True)
+            return
+        self._pool.release(conn)
+
+
+class ConnectionPool:
+    """Bounded, thread-safe DB connection pool.
+    Connections are created lazily up to `size`; callers wait up to `timeout`
+    seconds for a free one. Connections idle longer than `ping_after` are
+    health-checked on checkout and replaced if dead.
+    """
+
+    def __init__(self, factory, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, ping_after=DB_POOL_PING_AFTER):
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._idle = collections.deque()
+        self._open = 0
+        self._cond = threading.Condition()
+        self.checkouts = 0
+        self.waits = 0
+        self.created = 0
+        self.discarded = 0
+        self.checkout_seconds = 0.0
+        self.max_checkout_seconds = 0.0
+
+    def connection(self):
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        conn = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No free DB connection after {self.timeout}s (pool size {self.size})")
+                waited = True
+                self._cond.wait(remaining)
+
+        try:
+            if conn is not None and time.monotonic() - last_used > self.ping_after and not self._healthy(conn):
+                self._close_quietly(conn)
+                self.discarded += 1
+                conn = None
+            if conn is None:
+                conn = self._factory()
+                self.created += 1
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self.checkouts += 1
+            self.waits += waited
+            self.checkout_seconds += elapsed
+            self.max_checkout_seconds = max(self.max_checkout_seconds, elapsed)
+        return PooledConnection(self, conn)
+
+    def release(self, conn, broken=False):
+        with self._cond:
+            if broken:
+                self._open -= 1
+                self.discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if broken:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _healthy(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "created": self.created,
+                "discarded": self.discarded,
+                "avg_checkout_ms": round(1000 * self.checkout_seconds / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_checkout_ms": round(1000 * self.max_checkout_seconds, 3),
+            }
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._close_quietly(self._idle.pop()[0])
+                self._open -= 1
+
+
+db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def _connection_factory(backend):
+    if backend == "sqlite":
+        return lambda: SQLiteConnection(SQLITE_PATH)
+    return lambda: mysql.connector.connect(**DB_CONFIG)
+
+
+def init_db_pool(backend=None, size=None):
+    """(Re)create the shared connection pool for backend ("mysql" or "sqlite")."""
+    global db_pool, DB_BACKEND
+    backend = backend or DB_BACKEND
+    factory = _connection_factory(backend)
+    with _db_pool_lock:
+        if db_pool is not None:
+            db_pool.close()
+        DB_BACKEND = backend
+        db_pool = ConnectionPool(factory, size=size or DB_POOL_SIZE)
+    return db_pool
+
+
+def connect_database():
+    """Check a connection out of the shared pool; conn.close() returns it."""
+    if db_pool is None:
+        init_db_pool()
+    return db_pool.connection()
+
+
+class StreamConnection:
+    """Dedicated DB connection of one streamed response. close(abort=True) shuts the
+    socket instead of rolling back, which on mysql-connector would first read the
+    whole unread remainder of the result set into memory.
+    """
+
+    def __init__(self, owner, conn):
+        self._owner = owner
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self, abort=False):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            if abort:
+                getattr(conn, "shutdown", conn.close)()
+            else:
+                conn.close()
+        except Exception:
+            pass
+        finally:
+            self._owner._closed(abort)
+
+
+class StreamConnections:
+    """Opens at most `limit` StreamConnections at a time, outside the pool."""
+
+    def __init__(self, limit=DATA_STREAM_MAX):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self.open = 0
+        self.opened = 0
+        self.rejected = 0
+        self.aborted = 0
+
+    def connect(self):
+        """Return a new StreamConnection, or None when `limit` are already open."""
+        with self._lock:
+            if self.open >= self.limit:
+                self.rejected += 1
+                return None
+            self.open += 1
+        try:
+            conn = _connection_factory(DB_BACKEND)()
+        except Exception:
+            with self._lock:
+                self.open -= 1
+            raise
+        with self._lock:
+            self.opened += 1
+        return StreamConnection(self, conn)
+
+    def _closed(self, aborted):
+        with self._lock:
+            self.open -= 1
+            self.aborted += aborted
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "open": self.open,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "aborted": self.aborted,
+            }
+
+
+stream_connections = StreamConnections()
+
+
 def initiate_database():
+    conn = cursor = None
     try:
-        conn = mysql.connector.connect(host=DB_CONFIG['host'], user=DB_CONFIG['user'], password=DB_CONFIG['password'])
+        if DB_BACKEND == "mysql":
+            # The pool connects with database=..., so the database must exist first
+            server_config = {k: v for k, v in DB_CONFIG.items() if k != "database"}
+            bootstrap = mysql.connector.connect(**server_config)
+            bootstrap.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {DB_CONFIG['database']}")
+            bootstrap.close()
+            id_column = "id INT AUTO_INCREMENT PRIMARY KEY"
+            timestamp_index = ",\n                INDEX idx_drone_data_timestamp (timestamp)"
+        else:
+            id_column = "id INTEGER PRIMARY KEY AUTOINCREMENT"
+            timestamp_index = ""
+
+        conn = connect_database()
         cursor = conn.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS drone")
-        cursor.execute("USE drone")
-        cursor.execute("""
+        cursor.execute(f"""
             CREATE TABLE IF NOT EXISTS drone_data (
-                id INT AUTO_INCREMENT PRIMARY KEY,
+                {id_column},
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 altitude FLOAT,
                 latitude FLOAT,
@@ -264,9 +1509,13 @@ def initiate_database():
                 verticalspeed FLOAT,
                 yaw FLOAT,
                 satcount INT,
-                wp_dist FLOAT
+                wp_dist FLOAT,
+                human_detected BOOLEAN{timestamp_index}
             )
         """)
+        if DB_BACKEND != "mysql":
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_drone_data_timestamp ON drone_data (timestamp)")
+        conn.commit()
         logger.info("Database initialized")
     except Exception as e:
         logger.exception("Failed to init database: %s", e)
@@ -278,8 +1527,658 @@ def initiate_database():
             pass
 
 
-def connect_database():
-    return mysql.connector.connect(host=DB_CONFIG['host'], user=DB_CONFIG['user'], password=DB_CONFIG['password'], database=DB_CONFIG['database'])
+TELEMETRY_FLOAT_FIELDS = ('altitude', 'latitude', 'longitude', 'roll', 'groundspeed',
+                          'verticalspeed', 'yaw')
+
+# Column order of the tuples built by telemetry_row()
+TELEMETRY_COLUMNS = TELEMETRY_FLOAT_FIELDS + ('satcount', 'wp_dist', 'timestamp', 'human_detected')
+
+INSERT_TELEMETRY_QUERY = (
+    "INSERT INTO drone_data "
+    f"({', '.join(TELEMETRY_COLUMNS)}) "
+    f"VALUES ({','.join(['%s'] * len(TELEMETRY_COLUMNS))})"
+)
+
+
+def _is_missing(v):
+    return v in (None, "", "None")
+
+
+def _parse_number(sample, key):
+    v = sample.get(key)
+    if _is_missing(v):
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key}: not a number: {v!r}")
+
+
+def _parse_timestamp(v):
+    """Optional per-sample timestamp: epoch seconds (number or numeric string, e.g. from
+    a query parameter) or ISO-8601 string. Defaults to now.
+    """
+    if _is_missing(v):
+        return datetime.now()
+    try:
+        if isinstance(v, str):
+            try:
+                v = float(v)
+            except ValueError:
+                pass
+        if isinstance(v, (int, float)):
+            return datetime.fromtimestamp(v)
+        return datetime.fromisoformat(str(v))
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise ValueError(f"timestamp: invalid value: {v!r}")
+
+
+def telemetry_row(sample, detected):
+    """Validate one telemetry sample and return the INSERT_TELEMETRY_QUERY parameter tuple.
+    Raises ValueError describing the first bad field.
+    """
+    if not isinstance(sample, dict):
+        raise ValueError("sample must be a JSON object")
+
+    satcount = _parse_number(sample, 'satcount')
+    return (
+        *(_parse_number(sample, key) for key in TELEMETRY_FLOAT_FIELDS),
+        int(satcount) if satcount is not None else None,
+        _parse_number(sample, 'wp_dist'),
+        _parse_timestamp(sample.get('timestamp')),
+        detected,
+    )
+
+# Binary wire format for POST /data (Content-Type TELEMETRY_PACKED_MIME): an 8-byte
+# header (magic, schema version, record size) followed by fixed-layout little-endian
+# records. Missing floats are NaN, missing satcount is -1, a NaN timestamp means "now".
+# Schema 1 is equivalent to struct format "<dddffffffh" (50 bytes per sample).
+TELEMETRY_PACKED_MIME = "application/x-drone-telemetry"
+TELEMETRY_PACKED_MAGIC = b"DTLM"
+TELEMETRY_PACKED_HEADER = struct.Struct("<4sHH")
+TELEMETRY_PACKED_SCHEMAS = {
+    1: np.dtype([
+        ('timestamp', '<f8'), ('latitude', '<f8'), ('longitude', '<f8'),
+        ('altitude', '<f4'), ('roll', '<f4'), ('groundspeed', '<f4'),
+        ('verticalspeed', '<f4'), ('yaw', '<f4'), ('wp_dist', '<f4'), ('satcount', '<i2'),
+    ]),
+}
+TELEMETRY_PACKED_VERSION = 1
+# Packed timestamps must fall in [0, this) epoch seconds (year 3000)
+TELEMETRY_PACKED_MAX_TIMESTAMP = 32503680000.0
+
+
+def pack_telemetry(samples, version=TELEMETRY_PACKED_VERSION):
+    """Encode telemetry dicts (numbers or numeric strings) in the packed wire format."""
+    dtype = TELEMETRY_PACKED_SCHEMAS[version]
+    records = np.zeros(len(samples), dtype=dtype)
+    for name in dtype.names:
+        missing = -1 if name == 'satcount' else np.nan
+        records[name] = [missing if _is_missing(s.get(name)) else float(s[name]) for s in samples]
+    return TELEMETRY_PACKED_HEADER.pack(TELEMETRY_PACKED_MAGIC, version, dtype.itemsize) + records.tobytes()
+
+
+def unpack_telemetry(body, detected):
+    """Decode a packed telemetry batch with one np.frombuffer call.
+    Returns (rows, newest sample as a dict) like parse_telemetry(); raises ValueError
+    on a malformed body or an unknown schema version.
+    """
+    if len(body) < TELEMETRY_PACKED_HEADER.size:
+        raise ValueError("packed telemetry: truncated header")
+    magic, version, itemsize = TELEMETRY_PACKED_HEADER.unpack_from(body)
+    dtype = TELEMETRY_PACKED_SCHEMAS.get(version)
+    if magic != TELEMETRY_PACKED_MAGIC or dtype is None or itemsize != dtype.itemsize:
+        raise ValueError(f"packed telemetry: unsupported header {magic!r} v{version} ({itemsize} bytes)")
+    if (len(body) - TELEMETRY_PACKED_HEADER.size) % itemsize:
+        raise ValueError("packed telemetry: body is not a whole number of records")
+    records = np.frombuffer(body, dtype=dtype, offset=TELEMETRY_PACKED_HEADER.size)
+    if not len(records):
+        return [], None
+
+    def column(name):
+        values = records[name].astype(np.float64)
+        return np.where(np.isfinite(values), values, None).tolist()
+
+    satcount = records['satcount']
+    timestamps = records['timestamp']
+    given = np.isfinite(timestamps)
+    out_of_range = given & ((timestamps < 0) | (timestamps >= TELEMETRY_PACKED_MAX_TIMESTAMP))
+    if out_of_range.any():
+        index = int(np.argmax(out_of_range))
+        raise ValueError(f"packed telemetry: record {index}: timestamp out of range: {float(timestamps[index])!r}")
+    timestamps = np.where(given, timestamps, time.time())
+    columns = [column(name) for name in TELEMETRY_FLOAT_FIELDS]
+    columns.append(np.where(satcount >= 0, satcount.astype(np.int64), None).tolist())
+    columns.append(column('wp_dist'))
+    columns.append([datetime.fromtimestamp(ts) for ts in timestamps.tolist()])
+    columns.append([detected] * len(records))
+    rows = list(zip(*columns))
+    newest = {key: value for key, value in zip(TELEMETRY_COLUMNS, rows[-1]) if key != 'human_detected'}
+    return rows, newest
+
+
+def telemetry_select(after_id=None, time_from=None, time_to=None, limit=None, columns=None, order_by='id'):
+    """Build a keyset-paginated SELECT over drone_data ordered by id. Returns (sql, params).
+    columns/order_by are interpolated, so only pass trusted column names.
+    """
+    clauses, params = [], []
+    if after_id is not None:
+        clauses.append("id > %s")
+        params.append(after_id)
+    if time_from is not None:
+        clauses.append("timestamp >= %s")
+        params.append(time_from)
+    if time_to is not None:
+        clauses.append("timestamp <= %s")
+        params.append(time_to)
+
+    sql = f"SELECT {', '.join(columns) if columns else '*'} FROM drone_data"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {order_by}"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def iter_telemetry_rows(sql, params, chunk=DATA_STREAM_CHUNK, conn=None):
+    """Yield rows as dicts from an unbuffered (server-side) cursor, chunk rows at a time.
+    Reads from conn (e.g. a StreamConnection) or else a pooled connection, and holds it
+    until the generator is exhausted or closed; it is closed either way.
+    """
+    conn = conn or connect_database()
+    cursor = None
+    finished = False
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                break
+            yield from rows
+        finished = True
+    finally:
+        if not finished and isinstance(conn, StreamConnection):
+            # Client went away mid-stream: drop the socket, don't read the rest
+            conn.close(abort=True)
+        else:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            conn.close()
+
+
+# ============================================================
+# TELEMETRY AGGREGATION / DOWNSAMPLING
+# ============================================================
+
+def _epoch(ts):
+    """DB timestamp (datetime, or ISO string from the SQLite stand-in) to epoch seconds."""
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    return ts.timestamp()
+
+
+def aggregate_buckets(rows, fields, bucket_seconds):
+    """Fold timestamp-ordered rows into fixed-width buckets in one pass.
+    Returns [{'start', 'count', field: {'min', 'max', 'avg', 'last'}}, ...]; None values are skipped.
+    """
+    buckets = []
+    current = key = None
+    for row in rows:
+        if row['timestamp'] is None:
+            continue
+        k = int(_epoch(row['timestamp']) // bucket_seconds)
+        if k != key:
+            key = k
+            current = {'start': k * bucket_seconds, 'count': 0,
+                       **{f: {'min': None, 'max': None, 'sum': 0.0, 'n': 0, 'last': None} for f in fields}}
+            buckets.append(current)
+        current['count'] += 1
+        for f in fields:
+            v = row[f]
+            if v is None:
+                continue
+            acc = current[f]
+            acc['min'] = v if acc['min'] is None else min(acc['min'], v)
+            acc['max'] = v if acc['max'] is None else max(acc['max'], v)
+            acc['sum'] += v
+            acc['n'] += 1
+            acc['last'] = v
+
+    for bucket in buckets:
+        for f in fields:
+            acc = bucket[f]
+            bucket[f] = {'min': acc['min'], 'max': acc['max'],
+                         'avg': acc['sum'] / acc['n'] if acc['n'] else None, 'last': acc['last']}
+    return buckets
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of n_out points that best preserve the shape of y(x)."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (n_out - 2)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def lttb_series(rows, fields, points):
+    """Collect timestamp-ordered rows into per-field arrays and downsample each with LTTB.
+    Returns {field: [[epoch, value], ...]}.
+    """
+    t = {f: [] for f in fields}
+    v = {f: [] for f in fields}
+    for row in rows:
+        if row['timestamp'] is None:
+            continue
+        ts = _epoch(row['timestamp'])
+        for f in fields:
+            if row[f] is not None:
+                t[f].append(ts)
+                v[f].append(row[f])
+
+    series = {}
+    for f in fields:
+        x, y = np.asarray(t[f], dtype=np.float64), np.asarray(v[f], dtype=np.float64)
+        keep = lttb_indices(x, y, points)
+        series[f] = np.column_stack([x[keep], y[keep]]).tolist()
+    return series
+
+
+def write_telemetry_rows(rows):
+    """Insert telemetry rows with one executemany and one commit."""
+    conn = connect_database()
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(INSERT_TELEMETRY_QUERY, rows)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+# ============================================================
+# TELEMETRY WRITE-BEHIND QUEUE
+# ============================================================
+
+class TelemetryWriter:
+    """Bounded in-memory queue of telemetry rows drained by a background thread.
+    Rows are grouped into transactions of up to TELEMETRY_BATCH_SIZE. When the
+    DB is slow and the queue is full, submit() waits up to put_timeout and then
+    drops the remaining rows (counted), so callers see backpressure instead of
+    unbounded memory growth. stop() flushes everything still queued.
+    """
+
+    def __init__(self, maxsize=TELEMETRY_QUEUE_SIZE, batch_size=TELEMETRY_BATCH_SIZE,
+                 flush_interval=TELEMETRY_FLUSH_INTERVAL, put_timeout=TELEMETRY_PUT_TIMEOUT,
+                 retries=TELEMETRY_WRITE_RETRIES):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self._queue = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, rows):
+        """Queue rows for writing. Returns the number accepted; the rest were dropped."""
+        self.start()
+        for accepted, row in enumerate(rows):
+            try:
+                self._queue.put(row, timeout=self.put_timeout)
+            except queue.Full:
+                with self._lock:
+                    self.enqueued += accepted
+                    self.dropped += len(rows) - accepted
+                logger.warning("Telemetry queue full: dropped %d rows", len(rows) - accepted)
+                return accepted
+        with self._lock:
+            self.enqueued += len(rows)
+        return len(rows)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        for attempt in range(1, self.retries + 1):
+            start = time.perf_counter()
+            try:
+                write_telemetry_rows(batch)
+            except Exception:
+                logger.exception("Telemetry batch write failed (attempt %d/%d, %d rows)",
+                                 attempt, self.retries, len(batch))
+                if attempt < self.retries and not self._stop.is_set():
+                    time.sleep(0.5 * attempt)
+                continue
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+                self.flush_seconds += elapsed
+                self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            return
+        with self._lock:
+            self.failed += len(batch)
+
+    def stop(self, timeout=10.0):
+        """Flush queued rows and stop the writer thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if not self._queue.empty():
+            logger.error("Telemetry writer stopped with %d rows unflushed", self._queue.qsize())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "depth": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "avg_flush_ms": round(1000 * self.flush_seconds / self.batches, 3) if self.batches else 0.0,
+                "max_flush_ms": round(1000 * self.max_flush_seconds, 3),
+            }
+
+
+telemetry_writer = TelemetryWriter()
+atexit.register(telemetry_writer.stop)
+
+# ============================================================
+# LATEST TELEMETRY CACHE
+# ============================================================
+
+class LatestTelemetry:
+    """Newest telemetry sample, kept in memory for /recent.
+    Every update bumps a version number so clients can skip unchanged data.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._row = None
+        self.version = 0
+
+    def update(self, row):
+        with self._lock:
+            self._row = row
+            self.version += 1
+            return self.version
+
+    def seed(self, row):
+        """Fill an empty cache (e.g. from the DB on a cold start). Returns (version, row);
+        if a sample arrived in the meantime it is kept instead.
+        """
+        with self._lock:
+            if self._row is None:
+                self._row = row
+                self.version += 1
+            return self.version, self._row
+
+    def get(self):
+        """Return (version, row); row is None until the first update."""
+        with self._lock:
+            return self.version, self._row
+
+
+latest_telemetry = LatestTelemetry()
+
+# ============================================================
+# TELEMETRY HISTORY (GEOTAGGING)
+# ============================================================
+
+class TelemetryHistory:
+    """Fixed-size NumPy ring buffer of recent position telemetry keyed by monotonic time.
+    Fed by POST /data; interpolate() returns lat/lon/alt/yaw at arbitrary capture times
+    (time.monotonic(), as stored by FrameRingBuffer) in one vectorized pass.
+    """
+
+    FIELDS = ('latitude', 'longitude', 'altitude', 'yaw')
+
+    def __init__(self, size=TELEMETRY_HISTORY_SIZE, max_gap=TELEMETRY_GEOTAG_MAX_GAP):
+        self.size = size
+        self.max_gap = max_gap
+        self._samples = np.full((size, 1 + len(self.FIELDS)), np.nan)   # [monotonic t, *FIELDS]
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self._columns = [TELEMETRY_COLUMNS.index(f) for f in self.FIELDS]
+        self._timestamp = TELEMETRY_COLUMNS.index('timestamp')
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, rows):
+        """Append telemetry rows (TELEMETRY_COLUMNS tuples); their wall-clock timestamps
+        are mapped onto the monotonic clock. Missing values are stored as NaN.
+        """
+        if not rows:
+            return
+        offset = time.time() - time.monotonic()
+        samples = np.array([[row[self._timestamp].timestamp() - offset] + [row[i] for i in self._columns]
+                            for row in rows[-self.size:]], dtype=np.float64)
+        with self._lock:
+            positions = (self._next + np.arange(len(samples))) % self.size
+            self._samples[positions] = samples
+            self._next = int(positions[-1] + 1) % self.size
+            self._count = min(self.size, self._count + len(samples))
+
+    def interpolate(self, times):
+        """Return an (N, 4) array of [lat, lon, alt, yaw] at monotonic times.
+        Yaw is interpolated on the unwrapped angle. Rows are NaN where no sample is
+        within max_gap seconds, or where a field was never reported.
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        out = np.full((len(times), len(self.FIELDS)), np.nan)
+        with self._lock:
+            window = self._samples[:self._count].copy()
+        if not len(window):
+            return out
+        # Batched and replayed samples may arrive out of order
+        window = window[np.argsort(window[:, 0], kind='stable')]
+        t = window[:, 0]
+
+        right = np.clip(np.searchsorted(t, times), 0, len(t) - 1)
+        left = np.clip(right - 1, 0, len(t) - 1)
+        nearest = np.minimum(np.abs(times - t[left]), np.abs(times - t[right]))
+
+        for j, name in enumerate(self.FIELDS):
+            values = window[:, j + 1]
+            known = np.isfinite(values)
+            if not known.any():
+                continue
+            values = values[known]
+            if name == 'yaw':
+                values = np.degrees(np.unwrap(np.radians(values)))
+                out[:, j] = np.interp(times, t[known], values) % 360.0
+            else:
+                out[:, j] = np.interp(times, t[known], values)
+        out[nearest > self.max_gap] = np.nan
+        return out
+
+    def at(self, captured_at):
+        """Geotag for one capture time as a dict, or None if no telemetry is close enough."""
+        values = self.interpolate(captured_at)[0]
+        found = not np.isnan(values[:2]).any()
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not found:
+            return None
+        return {name: (None if np.isnan(v) else float(v)) for name, v in zip(self.FIELDS, values)}
+
+    def stats(self):
+        with self._lock:
+            t = self._samples[:self._count, 0]
+            span = float(t.max() - t.min()) if self._count else 0.0
+            return {
+                "size": self.size,
+                "samples": self._count,
+                "span_seconds": round(span, 1),
+                "geotag_hits": self.hits,
+                "geotag_misses": self.misses,
+            }
+
+
+telemetry_history = TelemetryHistory()
+
+# ============================================================
+# COMMAND QUEUE
+# ============================================================
+
+class CommandQueue:
+    """Ordered queue of commands, each with a monotonically increasing id.
+    Clients fetch the entries newer than the last id they received and confirm each one
+    via ack(), so a command is executed once instead of on every poll. Every entry records its
+    state (pending -> delivered -> acked) and delivery/ack latency.
+    """
+
+    def __init__(self, history=COMMAND_HISTORY):
+        self._entries = collections.deque(maxlen=history)
+        self._changed = threading.Condition()
+        self.last_id = 0
+        self.acked = 0
+        self.failed = 0
+
+    def push(self, payload):
+        """Append a command payload; returns its id and wakes waiting clients."""
+        with self._changed:
+            self.last_id += 1
+            self._entries.append({
+                "id": self.last_id,
+                "command": payload.get("command", ""),
+                "payload": payload,
+                "state": "pending",
+                "created": time.time(),
+                "delivery_ms": None,
+                "ack_ms": None,
+                "ok": None,
+                "error": None,
+                "_t": time.monotonic(),
+            })
+            self._changed.notify_all()
+            return self.last_id
+
+    def _unacked(self, after):
+        return [e for e in self._entries if e["id"] > after and e["state"] != "acked"]
+
+    def fetch(self, after, timeout=0.0):
+        """Block until an unacked command newer than `after` exists or timeout.
+        Returns (last_id, [unacked entries newer than after]) and marks those entries
+        delivered. `after` is the last id the client received, not its last ack:
+        delivered entries are handed out again until acked, so a command whose
+        response was lost is retried, but a client passing its last ack while a
+        command runs would get that command back immediately on every poll.
+        Acked entries are never handed out again, so a restarted client that asks
+        from an old id does not re-execute them.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._unacked(after), timeout)
+            now = time.monotonic()
+            entries = self._unacked(after)
+            for e in entries:
+                if e["state"] == "pending":
+                    e["state"] = "delivered"
+                    e["delivery_ms"] = round((now - e["_t"]) * 1000, 1)
+            return self.last_id, [self._public(e) for e in entries]
+
+    def ack(self, command_id, ok=True, error=None):
+        """Mark a command executed. Returns the updated entry, or None if unknown/expired."""
+        with self._changed:
+            for e in self._entries:
+                if e["id"] == command_id:
+                    if e["state"] != "acked":
+                        e["state"] = "acked"
+                        e["ack_ms"] = round((time.monotonic() - e["_t"]) * 1000, 1)
+                        e["ok"] = bool(ok)
+                        e["error"] = error
+                        if ok:
+                            self.acked += 1
+                        else:
+                            self.failed += 1
+                    return self._public(e)
+            return None
+
+    def latest(self):
+        """Return (last_id, newest payload) for clients of the single-slot GET /command."""
+        with self._changed:
+            payload = self._entries[-1]["payload"] if self._entries else {"command": ""}
+            return self.last_id, dict(payload)
+
+    def entries(self, state=None):
+        with self._changed:
+            return [self._public(e) for e in self._entries if state is None or e["state"] == state]
+
+    @staticmethod
+    def _public(entry):
+        return {k: v for k, v in entry.items() if not k.startswith("_")}
+
+    def stats(self):
+        with self._changed:
+            states = collections.Counter(e["state"] for e in self._entries)
+            delivery = [e["delivery_ms"] for e in self._entries if e["delivery_ms"] is not None]
+            ack = [e["ack_ms"] for e in self._entries if e["ack_ms"] is not None]
+            return {
+                "last_id": self.last_id,
+                "queued": len(self._entries),
+                "pending": states["pending"],
+                "delivered": states["delivered"],
+                "acked": self.acked,
+                "failed": self.failed,
+                "avg_delivery_ms": round(sum(delivery) / len(delivery), 1) if delivery else None,
+                "avg_ack_ms": round(sum(ack) / len(ack), 1) if ack else None,
+                "max_ack_ms": max(ack) if ack else None,
+            }
+
+
+command_queue = CommandQueue()
 
 # ============================================================
 # FLASK APP + ROUTES
@@ -288,9 +2187,6 @@ def connect_database():
 app = Flask(__name__)
 CORS(app)
 
-current_command = {"command": ""}
-command_lock = threading.Lock()
-
 droneData = {'altitude': None, 'latitude': None, 'longitude': None,
              'roll': None, 'groundspeed': None, 'verticalspeed': None,
              'yaw': None, 'satcount': None, 'wp_dist': None, 'human_detected': False}
@@ -305,100 +2201,292 @@ def foto(filename):
 
 
 
+def parse_telemetry(samples, detected):
+    """Validate every sample in one pass; bad rows are reported, not fatal.
+    Returns (rows, errors, valid samples).
+    """
+    rows, errors, valid = [], [], []
+    for index, sample in enumerate(samples):
+        try:
+            rows.append(telemetry_row(sample, detected))
+            valid.append(sample)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    return rows, errors, valid
+
+
+def record_latest(rows, valid, detected):
+    """Publish the newest valid sample (droneData, /recent cache, geotag history) and take
+    a detection photo. The photo is geotagged with telemetry interpolated at the frame's
+    capture time, or with the newest sample when none is close enough.
+    Returns the photo path or None.
+    """
+    if not valid:
+        return None
+    telemetry_history.add(rows)
+    data = valid[-1]
+    # update global with the newest sample
+    droneData.update(data)
+    latest_telemetry.update(dict(zip(TELEMETRY_COLUMNS, rows[-1])))
+
+    # Attach detection state
+    data["human_detected"] = detected
+
+    # Take photo ONLY if human detected
+    if not detected:
+        return None
+    # One snapshot for the geotag, the dedup check and the photo, even if the detector moves on
+    frame, detections, captured_at = last_detected
+    if frame is None:
+        logger.info("No detected frame available; photo not taken")
+        return None
+    geotag = telemetry_history.at(captured_at) if captured_at is not None else None
+    if geotag is not None:
+        data = dict(data, **geotag)
+    timestamp = photo_name()
+    teks = f"alt:{data.get('altitude')} lat:{data.get('latitude')} lon:{data.get('longitude')}"
+    photo_hash = None
+    if photo_dedup is not None:
+        photo_hash = photo_dedup.check(frame)
+        if photo_hash is None:
+            logger.debug("Skipped near-duplicate photo %s", timestamp)
+            return None
+    path = None
+    try:
+        if ASYNC_PHOTOS:
+            path = photo_writer.submit(teks, timestamp, drone_data=data, frame=frame, detections=detections)
+        else:
+            path = take_photo(teks, timestamp, drone_data=data, frame=frame, detections=detections)
+    finally:
+        # Dropped or failed photos are un-indexed, so the next near-duplicate can still be captured
+        if path is None and photo_hash is not None:
+            photo_dedup.forget(photo_hash)
+    return path
+
+
+def store_telemetry(rows):
+    """Queue (WRITE_BEHIND) or write rows. Returns (message, number of rows accepted)."""
+    if rows and WRITE_BEHIND:
+        # The background writer commits the rows; answer the client now
+        return 'Data queued', telemetry_writer.submit(rows)
+    if rows:
+        # One round trip and one commit for the whole batch
+        write_telemetry_rows(rows)
+    return 'Data saved', len(rows)
+
+
+def _int_arg(name, default=None):
+    """Query parameter as an int; raises ValueError (answered with a 400) on a bad value
+    instead of silently falling back to the default like request.args.get(type=int).
+    """
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+
+
+def _float_arg(name, default=None):
+    """Query parameter as a finite float; raises ValueError (answered with a 400) on a bad value."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+    if number is None or not np.isfinite(number):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    return number
+
+
 @app.route('/data', methods=['GET', 'POST'])
 def data_route():
     global droneData
 
     if request.method == 'GET':
+        # ?after_id=&from=&to= filter by id / timestamp; ?limit= returns one keyset page;
+        # ?format=ndjson streams one row per line. Without limit, rows are streamed.
+        try:
+            after_id = _int_arg('after_id')
+            time_from = _parse_timestamp(request.args['from']) if 'from' in request.args else None
+            time_to = _parse_timestamp(request.args['to']) if 'to' in request.args else None
+            limit = _int_arg('limit')
+            if limit is not None and not (1 <= limit <= DATA_MAX_LIMIT):
+                raise ValueError(f"limit must be between 1 and {DATA_MAX_LIMIT}")
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        sql, params = telemetry_select(after_id, time_from, time_to, limit)
+        dumps = app.json.dumps
+        ndjson = request.args.get('format') == 'ndjson'
+
+        if limit is not None and not ndjson:
+            try:
+                rows = list(iter_telemetry_rows(sql, params))
+            except Exception as e:
+                logger.exception("/data GET error: %s", e)
+                return jsonify({'error': str(e)}), 500
+            next_after_id = rows[-1]['id'] if len(rows) == limit else None
+            return jsonify({'data': rows, 'next_after_id': next_after_id}), 200
+
+        # Open the cursor and fetch the first chunk before answering, so a DB failure
+        # is still a 500 JSON error instead of a 200 with a truncated body
         try:
-            conn = connect_database()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM drone_data")
-            rows = cursor.fetchall()
-            return jsonify(rows), 200
+            conn = stream_connections.connect()
+        except Exception as e:
+            logger.exception("/data GET error: %s", e)
+            return jsonify({'error': str(e)}), 500
+        if conn is None:
+            return jsonify({'error': f'too many concurrent /data streams (max {DATA_STREAM_MAX}); '
+                                     'retry later or page with ?limit='}), 503
+        rows = iter_telemetry_rows(sql, params, conn=conn)
+        try:
+            first = next(rows, None)
         except Exception as e:
             logger.exception("/data GET error: %s", e)
             return jsonify({'error': str(e)}), 500
-        finally:
-            try:
-                cursor.close(); conn.close()
-            except Exception:
-                pass
 
-    # POST
+        def stream():
+            try:
+                if first is not None:
+                    yield first
+                    yield from rows
+            finally:
+                rows.close()
+
+        if ndjson:
+            def generate_ndjson():
+                for row in stream():
+                    yield dumps(row) + "\n"
+            return Response(generate_ndjson(), mimetype='application/x-ndjson')
+
+        def generate_array():
+            yield "["
+            for i, row in enumerate(stream()):
+                yield ("," if i else "") + dumps(row)
+            yield "]"
+        return Response(generate_array(), mimetype='application/json')
+
+    # POST: a single telemetry object, a JSON array of them for batched/replayed samples,
+    # or a packed binary batch (Content-Type TELEMETRY_PACKED_MIME)
     try:
-        data = request.get_json(force=True)
-        # update global
-        droneData.update(data)
-
-        # Attach detection state
-        data["human_detected"] = human_detected
-
-        photo_path = None
-
-        # Take photo ONLY if human detected
-        if human_detected:
-            timestamp = datetime.now().strftime('%m-%d-%H-%M-%S')
-            teks = f"alt:{data.get('altitude')} lat:{data.get('latitude')} lon:{data.get('longitude')}"
-            photo_path = take_photo(teks, timestamp, drone_data=data)
-
-        # Insert to DB (convert strings to floats when possible)
-        conn = connect_database()
-        cursor = conn.cursor()
-
-        insert_query = (
-            "INSERT INTO drone_data "
-            "(altitude, latitude, longitude, roll, groundspeed, verticalspeed, yaw, satcount, wp_dist, timestamp, human_detected) "
-            "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
-        )
-
-        def _to_float(v):
+        detected = human_detected
+        if request.mimetype == TELEMETRY_PACKED_MIME:
+            is_batch, errors = True, []
             try:
-                return float(v) if v not in (None, "", "None") else None
-            except Exception:
-                return None
-
-        data_tuple = (
-            _to_float(data.get('altitude')),
-            _to_float(data.get('latitude')),
-            _to_float(data.get('longitude')),
-            _to_float(data.get('roll')),
-            _to_float(data.get('groundspeed')),
-            _to_float(data.get('verticalspeed')),
-            _to_float(data.get('yaw')),
-            int(float(data.get('satcount'))) if data.get('satcount') not in (None, "", "None") else None,
-            _to_float(data.get('wp_dist')),
-            datetime.now(),
-            human_detected
-        )
-
-        cursor.execute(insert_query, data_tuple)
-        conn.commit()
+                rows, newest = unpack_telemetry(request.get_data(), detected)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            valid = [newest] if newest is not None else []
+        else:
+            payload = request.get_json(force=True)
+            is_batch = isinstance(payload, list)
+            samples = payload if is_batch else [payload]
+
+            rows, errors, valid = parse_telemetry(samples, detected)
+            if not is_batch and errors:
+                return jsonify({'error': errors[0]['error']}), 400
+
+        photo_path = record_latest(rows, valid, detected)
+        message, accepted = store_telemetry(rows)
+        if rows and not accepted:
+            # Nothing was stored: the whole request can be retried
+            return jsonify({
+                'error': 'telemetry queue full',
+                'saved': 0,
+                'dropped': len(rows),
+            }), 503
+        if accepted < len(rows):
+            # The first `saved` rows are stored; only the last `dropped` samples should be resent
+            return jsonify({
+                'message': 'telemetry queue full',
+                'saved': accepted,
+                'dropped': len(rows) - accepted,
+                'errors': errors,
+                'human_detected': detected,
+                'photo': photo_path
+            }), 202
+
+        if not is_batch:
+            return jsonify({
+                'message': message,
+                'human_detected': detected,
+                'photo': photo_path
+            }), 200
 
         return jsonify({
-            'message': 'Data saved',
-            'human_detected': human_detected,
+            'message': message,
+            'saved': len(rows),
+            'errors': errors,
+            'human_detected': detected,
             'photo': photo_path
         }), 200
 
     except Exception as e:
         logger.exception("/data POST error: %s", e)
         return jsonify({'error': str(e)}), 500
-    finally:
-        try:
-            cursor.close(); conn.close()
-        except Exception:
-            pass
+
+@app.route('/data/aggregate', methods=['GET'])
+def data_aggregate_route():
+    """Downsampled telemetry history for dashboards, computed in one streaming pass.
+    ?fields=altitude,groundspeed&from=&to=
+    mode=bucket (default): fixed-width `bucket`-second buckets with min/max/avg/last per field
+    mode=lttb: about `points` visually representative points per field
+    """
+    numeric = [c for c in TELEMETRY_COLUMNS if c not in ('timestamp', 'human_detected')]
+    try:
+        fields = request.args.get('fields', ','.join(AGGREGATE_FIELDS)).split(',')
+        unknown = [f for f in fields if f not in numeric]
+        if unknown:
+            raise ValueError(f"unknown fields {unknown}; choose from {numeric}")
+        time_from = _parse_timestamp(request.args['from']) if 'from' in request.args else None
+        time_to = _parse_timestamp(request.args['to']) if 'to' in request.args else None
+        mode = request.args.get('mode', 'bucket')
+        bucket = _float_arg('bucket', AGGREGATE_BUCKET_SECONDS)
+        points = _int_arg('points', 1000)
+        if mode not in ('bucket', 'lttb'):
+            raise ValueError("mode must be 'bucket' or 'lttb'")
+        if bucket <= 0 or not (3 <= points <= AGGREGATE_MAX_POINTS):
+            raise ValueError(f"bucket must be > 0 and points between 3 and {AGGREGATE_MAX_POINTS}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    sql, params = telemetry_select(time_from=time_from, time_to=time_to,
+                                   columns=['timestamp', *fields], order_by='timestamp')
+    try:
+        rows = iter_telemetry_rows(sql, params)
+        if mode == 'lttb':
+            return jsonify({'mode': mode, 'points': points, 'series': lttb_series(rows, fields, points)}), 200
+        return jsonify({'mode': mode, 'bucket': bucket, 'buckets': aggregate_buckets(rows, fields, bucket)}), 200
+    except Exception as e:
+        logger.exception("/data/aggregate error: %s", e)
+        return jsonify({'error': str(e)}), 500
+
 
 @app.route('/recent', methods=['GET'])
 def recent_route():
+    """Latest telemetry from the in-memory cache; the DB is only read on a cold start.
+    ?version=<n> answers 304 when nothing newer than version n has arrived.
+    """
+    version, row = latest_telemetry.get()
+    if row is not None:
+        if request.args.get('version', type=int) == version:
+            return '', 304
+        return jsonify({'data': row, 'version': version}), 200
+
+    # Cold start: nothing posted since the server started
     try:
         conn = connect_database()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM drone_data ORDER BY timestamp DESC LIMIT 1")
+        # Same columns as the cached rows (no id), so the response shape doesn't depend on the cache
+        cursor.execute(f"SELECT {', '.join(TELEMETRY_COLUMNS)} FROM drone_data ORDER BY id DESC LIMIT 1")
         row = cursor.fetchone()
         if row:
-            return jsonify({'data': row}), 200
+            version, row = latest_telemetry.seed(row)
+            return jsonify({'data': row, 'version': version}), 200
         else:
             return jsonify({'data': None}), 404
     except Exception as e:
@@ -411,6 +2499,54 @@ def recent_route():
             pass
 
 
+@app.route('/stats', methods=['GET'])
+def stats_route():
+    pool = detection_pool
+    return jsonify({
+        'detection_pool': pool.stats() if pool is not None else None,
+        'motion_gate': motion_gate.stats() if motion_gate is not None else None,
+        'capture': frame_buffer.stats() if frame_buffer is not None else None,
+        'stream': stream_buffer.stats(),
+        'tracker': box_tracker.stats() if box_tracker is not None else None,
+        'db_pool': db_pool.stats() if db_pool is not None else None,
+        'data_streams': stream_connections.stats(),
+        'telemetry_writer': telemetry_writer.stats(),
+        'photo_writer': photo_writer.stats(),
+        'photo_dedup': photo_dedup.stats() if photo_dedup is not None else None,
+        'command_queue': command_queue.stats(),
+        'telemetry_history': telemetry_history.stats(),
+    }), 200
+
+
+@app.route('/stream', methods=['GET'])
+def stream_route():
+    """Annotated detector frames as a multipart MJPEG stream, paced to STREAM_FPS."""
+    def generate():
+        seq = 0
+        jpeg = None
+        interval = 1.0 / STREAM_FPS
+        next_frame = time.monotonic()
+        while True:
+            item = stream_buffer.wait_jpeg(seq, timeout=STREAM_IDLE_TIMEOUT)
+            if item is None:
+                if stream_buffer.closed:
+                    # Detector stopped (e.g. the debug video ended): end the response
+                    return
+                if jpeg is None:
+                    continue
+                # No new frame: repeat the last one, so a viewer that went away is
+                # noticed on the write instead of leaking this thread
+            else:
+                seq, jpeg = item
+            yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                   + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+            next_frame += interval
+            time.sleep(max(0.0, next_frame - time.monotonic()))
+            next_frame = max(next_frame, time.monotonic())
+
+    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
 @app.route('/follow', methods=['GET', 'POST'])
 def follow_route():
     global target
@@ -428,12 +2564,147 @@ def follow_route():
     return jsonify({'message': 'target updated', 'target': target}), 200
 
 
+def parse_ack(ack):
+    """Validate one ack object: {"id": <int>, "ok": <bool, default true>, "error": <str>}.
+    Returns (id, ok, error); raises ValueError on a malformed ack.
+    """
+    if not isinstance(ack, dict):
+        raise ValueError("ack must be a JSON object")
+    try:
+        command_id = int(ack['id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("ack: missing or invalid id")
+    ok = ack.get('ok', True)
+    if not isinstance(ok, bool):
+        raise ValueError(f"ack {command_id}: ok must be true or false, got {ok!r}")
+    return command_id, ok, ack.get('error')
+
+
+@app.route('/sync', methods=['POST'])
+def sync_route():
+    """One round trip per Mission Planner cycle: telemetry up, commands and state down.
+    Body: {"telemetry": sample or [samples], "acks": [{"id", "ok", "error"}],
+           "after": <last received id>, "timeout": <s>}; every key is optional.
+    Instead of "telemetry", "telemetry_packed" may carry a base64 packed batch
+    (same layout as the TELEMETRY_PACKED_MIME body of POST /data).
+    With `timeout` the response long-polls for a new command (telemetry is stored first).
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'invalid format'}), 400
+    try:
+        after = int(payload.get('after', command_queue.last_id))
+        timeout = min(max(0.0, float(payload.get('timeout', 0))), COMMAND_MAX_WAIT)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'invalid after/timeout'}), 400
+    try:
+        acks = [parse_ack(ack) for ack in payload.get('acks') or []]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    for command_id, ok, error in acks:
+        command_queue.ack(command_id, ok, error)
+
+    # Packed telemetry travels base64-encoded in "telemetry_packed"; a malformed
+    # body is rejected up front like on POST /data
+    detected = human_detected
+    packed = None
+    if payload.get('telemetry_packed') is not None:
+        try:
+            packed = unpack_telemetry(base64.b64decode(payload['telemetry_packed'], validate=True), detected)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f"telemetry_packed: {e}"}), 400
+
+    result = {}
+    samples = payload.get('telemetry')
+    if packed is not None or samples is not None:
+        try:
+            if packed is not None:
+                rows, newest = packed
+                errors, valid = [], [newest] if newest is not None else []
+            else:
+                samples = samples if isinstance(samples, list) else [samples]
+                rows, errors, valid = parse_telemetry(samples, detected)
+            photo = record_latest(rows, valid, detected)
+            message, accepted = store_telemetry(rows)
+            result['telemetry'] = {'message': message, 'saved': accepted,
+                                   'dropped': len(rows) - accepted, 'errors': errors, 'photo': photo}
+        except Exception as e:
+            # Telemetry trouble must not stop command delivery
+            logger.exception("/sync telemetry error: %s", e)
+            result['telemetry'] = {'error': str(e)}
+
+    version, entries = command_queue.fetch(after, timeout)
+    has_target = target.get('latitude') is not None and target.get('longitude') is not None
+    result.update({
+        'version': version,
+        'commands': entries,
+        'target': dict(target) if has_target else None,
+        'human_detected': human_detected,
+        'detections': len(last_detections),
+        'last_detection_time': last_detection_time.isoformat() if last_detection_time else None,
+    })
+    return jsonify(result), 200
+
+
+@app.route('/command/stream', methods=['GET'])
+def command_stream_route():
+    """Server-Sent Events: one `command` event per queued command, id = command id."""
+    last_seen = request.headers.get('Last-Event-ID', type=int)
+    if last_seen is None:
+        try:
+            last_seen = _int_arg('after', command_queue.last_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    def generate():
+        after = last_seen
+        while True:
+            _, entries = command_queue.fetch(after, COMMAND_SSE_KEEPALIVE)
+            for entry in entries:
+                after = entry['id']
+                yield f"id: {after}\nevent: command\ndata: {app.json.dumps(entry)}\n\n"
+            if not entries:
+                yield ": keepalive\n\n"
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/command/ack', methods=['POST'])
+def command_ack_route():
+    """Client confirms it executed command `id` (optionally {"ok": false, "error": "..."})."""
+    try:
+        command_id, ok, error = parse_ack(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    entry = command_queue.ack(command_id, ok, error)
+    if entry is None:
+        return jsonify({'error': 'unknown command id'}), 404
+    return jsonify(entry), 200
+
+
+@app.route('/command/queue', methods=['GET'])
+def command_queue_route():
+    """Queued commands with their state and latency; ?state=pending|delivered|acked filters."""
+    return jsonify({'last_id': command_queue.last_id,
+                    'commands': command_queue.entries(request.args.get('state'))}), 200
+
+
 @app.route('/command', methods=['GET', 'POST'])
 def command_route():
-    global current_command
     if request.method == 'GET':
-        with command_lock:
-            return jsonify(current_command)
+        # ?after=<last received id>&timeout=<s> returns the newer commands, long-polling until one is posted
+        try:
+            after = _int_arg('after')
+            timeout = min(_float_arg('timeout', COMMAND_MAX_WAIT), COMMAND_MAX_WAIT)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if after is None:
+            version, command = command_queue.latest()
+            return jsonify(dict(command, version=version))
+        version, entries = command_queue.fetch(after, max(0.0, timeout))
+        return jsonify({'version': version, 'commands': entries})
 
     # POST
     try:
@@ -508,10 +2779,10 @@ def command_route():
         #     except Exception:
         #         return jsonify({'error': 'invalid numeric parameters'}), 400
 
-        with command_lock:
-            current_command = payload
+        command_id = command_queue.push(payload)
 
-        return jsonify({'message': 'command updated', 'command': command}), 200
+        return jsonify({'message': 'command queued', 'command': command, 'id': command_id,
+                        'version': command_id}), 200
 
     except Exception as e:
         logger.exception("/command error: %s", e)